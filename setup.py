@@ -1,9 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """The setup script."""
+import os
 import sys
 
-from setuptools import find_packages, setup
+from setuptools import setup
 
 
 def get_version(filename):
@@ -27,6 +28,12 @@ except OSError:
 # requirements for use
 requirements = ['click']
 
+# optional requirements for faster compression
+fast_requirements = ['deflate', 'google-re2', 'isal', 'zlib-ng']
+
+# optional requirements for Zstandard compression (built-in for Python 3.14)
+zstd_requirements = ['zipfile-zstd; python_version < "3.14"']
+
 # requirements for development (testing, generating docs)
 dev_requirements = [
     'coverage<5.0',  # 5.0 breaks a lot of other packages:
@@ -37,6 +44,7 @@ dev_requirements = [
     'gitpython',
     'isort',
     'ipython',
+    'packaging',
     'pre-commit',
     'pdbpp',
     'pylint',
@@ -52,6 +60,13 @@ if sys.version_info >= (3, 6):
 
 version = get_version('./src/zip_files/__init__.py')
 
+# Optionally, compile the folder traversal with mypyc (must be installed)
+ext_modules = []
+if os.environ.get('ZIP_FILES_USE_MYPYC', '0') == '1':
+    from mypyc.build import mypycify
+
+    ext_modules = mypycify(['src/zip_files/_traverse.py'])
+
 setup(
     author="Michael Goerz",
     author_email='mail@michaelgoerz.net',
@@ -75,15 +90,20 @@ setup(
     description="Command line utilities for creating zip files",
     python_requires='>=3.6',
     install_requires=requirements,
-    extras_require={'dev': dev_requirements},
+    extras_require={
+        'dev': dev_requirements,
+        'fast': fast_requirements,
+        'zstd': zstd_requirements,
+    },
     license="BSD license",
     long_description=readme + '\n\n' + history,
     long_description_content_type='text/x-rst',
     include_package_data=True,
     keywords='zip',
     name='zip_files',
-    packages=find_packages(where="src"),
+    packages=['zip_files'],
     package_dir={"": "src"},
+    ext_modules=ext_modules,
     entry_points='''
         [console_scripts]
         zip-files=zip_files.zip_files:zip_files
@@ -0,0 +1,46 @@
+"""Traversal of folders for the files to add to a zip archive.
+
+This module is fully type-annotated so that it can be compiled with mypyc,
+cf. ``setup.py``. Without compilation, it works as a pure Python module.
+"""
+import os
+from typing import Iterator, List, Tuple
+
+
+__all__ = ['walk']
+
+
+def _scandir(path: str) -> List["os.DirEntry[str]"]:
+    """List the entries of the directory `path` (as :class:`os.DirEntry`)."""
+    with os.scandir(path) as entries:
+        return list(entries)
+
+
+def walk(path: str, arcname: str) -> Iterator[Tuple[str, str]]:
+    """Iterate over all files in `path`, recursively.
+
+    Yields tuples ``(file, arcname)`` of the path of each file and its name
+    inside the zip archive, where `path` itself has the given `arcname`. If
+    `path` is a file, yield only `path`. Files inside folders are yielded
+    depth-first, in the order they are listed by :func:`os.scandir`. This
+    uses the file type information cached in :class:`os.DirEntry` instead of
+    calling :func:`os.stat` for every file.
+    """
+    if os.path.isfile(path):
+        yield path, arcname
+        return
+    if not os.path.isdir(path):
+        return
+    prefix = arcname + os.sep if arcname else ''
+    stack = [(iter(_scandir(path)), prefix)]
+    while stack:
+        entries, prefix = stack[-1]
+        for entry in entries:
+            if entry.is_dir():
+                subfolder = prefix + entry.name + os.sep
+                stack.append((iter(_scandir(entry.path)), subfolder))
+                break  # continue with the subfolder
+            if entry.is_file():
+                yield entry.path, prefix + entry.name
+        else:
+            stack.pop()
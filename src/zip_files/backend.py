@@ -3,16 +3,31 @@
 This handles the both the ``zip-files`` and the ``zip-folder`` command line
 utility.
 """
+import fnmatch
+import functools
+import io
 import logging
+import mmap
 import os
-import random
+import queue
 import re
+import shutil
+import stat
+import tarfile
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
 from pathlib import Path
-from string import ascii_letters
-from zipfile import ZipFile, ZipInfo
+from zipfile import ZIP_STORED, ZipInfo
 
 import click
 
+from ._traverse import walk
+from .zipfile_extensions import ZipFile
+
 
 try:
     # Python > 3.6
@@ -21,9 +36,72 @@ except ImportError:
     # Python 3.6
     from typing import Pattern as RegexPattern
 
+try:
+    import re2
+except ImportError:
+    re2 = None
+
 
 __all__ = ['zip_files']
 
+logger = logging.getLogger(__name__)
+
+# Size of the write buffer for the zip archive
+_OUTPUT_BUFSIZE = 1024 * 1024
+
+# Size of the chunks in which files are streamed into the zip archive
+_COPY_BUFSIZE = 1024 * 1024
+
+# Files of at least this size are memory-mapped instead of read in chunks
+_MMAP_MIN_SIZE = 1024 * 1024
+
+# Files up to this size are read by a background thread while compressing
+_READ_AHEAD_MAX_SIZE = 1024 * 1024
+
+# Maximum number of files held in memory by the background thread
+_READ_AHEAD_QUEUE_SIZE = 4
+
+# Number of shards (partial zip archives) per process, for --jobs > 1
+_SHARDS_PER_JOB = 4
+
+# Memory budget for compiling a combined exclude regex with RE2
+_RE2_MAX_MEM = 64 * 1024 * 1024
+
+# Files with these suffixes are already compressed, and are stored as-is
+_STORED_SUFFIXES = frozenset(
+    [
+        '.7z',
+        '.avif',
+        '.br',
+        '.bz2',
+        '.flac',
+        '.gif',
+        '.gz',
+        '.heic',
+        '.jpeg',
+        '.jpg',
+        '.lz4',
+        '.lzma',
+        '.m4a',
+        '.mkv',
+        '.mov',
+        '.mp3',
+        '.mp4',
+        '.ogg',
+        '.pdf',
+        '.png',
+        '.rar',
+        '.tbz2',
+        '.tgz',
+        '.txz',
+        '.webm',
+        '.webp',
+        '.xz',
+        '.zip',
+        '.zst',
+    ]
+)
+
 _VCS_EXCLUDES = [
     'CVS/*',
     'RCS/*',
@@ -49,6 +127,7 @@ _VCS_EXCLUDES = [
 ]
 
 
+@functools.lru_cache(maxsize=4096)
 def gitignore_to_regex(prefix, pattern):
     """Convert a gitignore glob `pattern` into a regex string.
 
@@ -56,10 +135,9 @@ def gitignore_to_regex(prefix, pattern):
     gitignore uses.
 
     The resulting regex will only match strings that start with `prefix` (a
-    path string for a folder in which the `pattern` applies)
+    path string for a folder in which the `pattern` applies). Results are
+    cached.
     """
-    logger = logging.getLogger(__name__)
-
     # while the gitignore always uses forward-slashes as path separators, the
     # pathnames the regex must match does not: we have to use a
     # platform-dependent path separator in the regex we produce
@@ -84,44 +162,48 @@ def gitignore_to_regex(prefix, pattern):
         # semantics
         pattern = pattern + "**"
 
-    # Process all special characters in gitignore-style glob patterns.
-    replacements = [  # map glob-patterns to equivalent regex
-        # A leading "**" followed by a slash means match in all directories
-        (re.compile(r'^\*\*/'), rf'(?:.*{sep})?'),
-        # A trailing "/**" matches everything inside
-        (re.compile(r'/\*\*$'), rf'{sep}.*$'),
-        # A slash followed by two consecutive asterisks then a slash matches
-        # zero or more directories
-        (re.compile(r'/\*\*/'), rf'(?:{sep}[^{sep}]+)*{sep}?'),
-        # An asterisk "*" matches anything except a slash.
-        (re.compile(r'\*'), rf'[^{sep}]+'),
-        # The character "?" matches any one character except "/" (path sep)
-        (re.compile(r'\?'), rf'[^{sep}]'),
-        # The character "/" is a path separator, independent of platform
-        (re.compile(r'/'), sep),
-        # The range notation, e.g. [a-zA-Z], can be used to match one of the
-        # characters in a range. -- handled below, since it doesn't have a
-        # fixed replacement.
-    ]
-    # Anything that involves a special regex character needs to be "protected":
-    # we replace it with a random ascii-string and create a map of which regex
-    # pattern the protected string should restored as
-    protected_replacements = []
-    protected_pattern = pattern
-    for (rx, repl) in replacements:
-        for glob_expr in rx.findall(pattern):
-            prot_key = ''.join(random.choices(ascii_letters, k=32))
-            protected_replacements.append((prot_key, repl))
-            protected_pattern = protected_pattern.replace(glob_expr, prot_key)
-    for range_expr in re.findall(r'\[.*?\]', pattern):  # [A-Za-z], [cod]
-        prot_key = ''.join(random.choices(ascii_letters, k=32))
-        protected_replacements.append((prot_key, range_expr))
-        protected_pattern = protected_pattern.replace(range_expr, prot_key)
-
-    # un-protect the pattern
-    regex_pattern = re.escape(protected_pattern)
-    for (prot_key, repl) in protected_replacements:
-        regex_pattern = regex_pattern.replace(re.escape(prot_key), repl)
+    # Process all special characters in gitignore-style glob patterns, in a
+    # single pass over the pattern: each glob token is translated to the
+    # equivalent regex, and anything else is escaped
+    tokens = []
+    i = 0
+    while i < len(pattern):
+        if i == 0 and pattern.startswith("**/"):
+            # A leading "**" followed by a slash means match in all
+            # directories
+            tokens.append(rf'(?:.*{sep})?')
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            # A trailing "/**" matches everything inside
+            tokens.append(rf'{sep}.*$')
+            i += 3
+        elif pattern.startswith("/**/", i):
+            # A slash followed by two consecutive asterisks then a slash
+            # matches zero or more directories
+            tokens.append(rf'(?:{sep}[^{sep}]+)*{sep}?')
+            i += 4
+        elif pattern[i] == "*":
+            # An asterisk "*" matches anything except a slash.
+            tokens.append(rf'[^{sep}]+')
+            i += 1
+        elif pattern[i] == "?":
+            # The character "?" matches any one character except "/"
+            tokens.append(rf'[^{sep}]')
+            i += 1
+        elif pattern[i] == "/":
+            # The character "/" is a path separator, independent of platform
+            tokens.append(sep)
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 1 :]:
+            # The range notation, e.g. [a-zA-Z], can be used to match one of
+            # the characters in a range. This is the same in a regex.
+            end = pattern.index("]", i + 1) + 1
+            tokens.append(pattern[i:end])
+            i = end
+        else:
+            tokens.append(re.escape(pattern[i]))
+            i += 1
+    regex_pattern = "".join(tokens)
     if regex_pattern.startswith(sep):
         # strip of any leading `sep` so as to not conflict with the `sep` we
         # insert between prefix and pattern below
@@ -140,50 +222,133 @@ def gitignore_to_regex(prefix, pattern):
     return regex
 
 
-def _get_single_gitignore_excludes(gitignore, relative_to, root_folder):
+def glob_to_regex(pattern):
+    """Convert a glob `pattern` for :meth:`pathlib.PurePath.match` to a regex.
+
+    The resulting regex string matches a (relative) path string if and only
+    if the path matches `pattern` from the right: each component of the
+    `pattern` must match the corresponding trailing component of the path,
+    where "*" matches any number and "?" matches a single character inside
+    the component, and "[...]" matches a character range. On Windows,
+    matching is case-insensitive.
+
+    Raises:
+        ValueError: If `pattern` is empty.
+    """
+    if os.path.isabs(pattern) or os.path.splitdrive(pattern)[0]:
+        # relative paths never match an absolute pattern. The regex matches
+        # nothing, like "(?!)", but unlike a lookahead, RE2 supports it
+        return r'[^\s\S]'
+    sep = re.escape(os.path.sep)
+    parts = [
+        part
+        for part in re.split(r'[\\/]' if os.name == 'nt' else '/', pattern)
+        if part not in ('', '.')
+    ]
+    if len(parts) == 0:
+        raise ValueError("empty pattern")
+    regex = (
+        rf'(?:.*{sep})?'
+        + sep.join(_glob_part_to_regex(part, sep) for part in parts)
+        + '$'
+    )
+    if os.name == 'nt':
+        regex = '(?i:' + regex + ')'
+    return regex
+
+
+def _glob_part_to_regex(part, sep):
+    """Convert a single path component of a glob pattern to a regex.
+
+    This follows :func:`fnmatch.translate`, except that no wildcard matches
+    the path separator `sep`. Character sets ("[...]") are translated by
+    :func:`fnmatch.translate` directly.
+    """
+    tokens = []
+    i = 0
+    while i < len(part):
+        char = part[i]
+        i += 1
+        if char == '*':
+            tokens.append(rf'[^{sep}]*')
+        elif char == '?':
+            tokens.append(rf'[^{sep}]')
+        elif char == '[':
+            end = i
+            if end < len(part) and part[end] == '!':
+                end += 1
+            if end < len(part) and part[end] == ']':
+                end += 1
+            end = part.find(']', end)
+            if end < 0:
+                tokens.append(re.escape(char))
+                continue
+            # fnmatch.translate(...) is '(?s:<regex>)\\Z'
+            regex = fnmatch.translate(part[i - 1 : end + 1])[4:-3]
+            i = end + 1
+            if regex == '.':  # "[!]"
+                tokens.append(rf'[^{sep}]')
+            elif regex.startswith('[^'):
+                tokens.append(regex[:-1] + sep + ']')
+            else:
+                tokens.append(regex)
+        else:
+            tokens.append(re.escape(char))
+    return ''.join(tokens)
+
+
+@functools.lru_cache(maxsize=4096)
+def _compile_cached(regex):
+    """Compile `regex`, caching the result beyond the cache of :mod:`re`.
+
+    The same patterns (e.g. "*.pyc") may occur in many .gitignore files, and
+    the same globs (e.g. ``_VCS_EXCLUDES``) in every call to
+    :func:`zip_files`.
+    """
+    return re.compile(regex)
+
+
+def _get_single_gitignore_excludes(gitignore, prefix):
     """Return a list of excludes from the given .gitignore file.
 
     Args:
-        gitignore (pathlib.Path): The location of the .gitignore file
-        relative_to (pathlib.Path): The path to which `gitignore` (and the
-            patterns therein) should be made relative
-        root_folder (pathlib.Path): A folder to prepend to all "absolute"
-            patterns.
+        gitignore (str): The location of the .gitignore file
+        prefix (str): The folder of the .gitignore file inside the zip
+            archive, to which all patterns are relative
     """
-    if root_folder is None:
-        root_folder = Path(".")
-    with gitignore.open() as in_fh:
-        exclude = []
-        folder = gitignore.relative_to(relative_to).parent
-        prefix = root_folder / folder
-        for line in in_fh:
-            if line.startswith("#") or line.strip() == "":
-                # .gitignore files may contain comments
-                continue
-            if line.startswith("!"):
-                click.echo(
-                    "WARNING: Negated pattern %s in %s will be ignored"
-                    % (line.strip(), gitignore),
-                    err=True,
-                )
-                continue
-            regex = gitignore_to_regex(str(prefix), line)
-            exclude.append(re.compile(regex))
-        return exclude
+    with open(gitignore, encoding='utf-8', errors='replace') as in_fh:
+        lines = in_fh.read().splitlines()
+    exclude = []
+    for line in lines:
+        if line.startswith("#") or line.strip() == "":
+            # .gitignore files may contain comments
+            continue
+        if line.startswith("!"):
+            click.echo(
+                "WARNING: Negated pattern %s in %s will be ignored"
+                % (line.strip(), gitignore),
+                err=True,
+            )
+            continue
+        regex = gitignore_to_regex(prefix, line)
+        exclude.append(_compile_cached(regex))
+    return exclude
+
 
+def _get_gitignore_excludes(entries):
+    """Return a list of excludes from all .gitignore files in `entries`.
 
-def _get_gitignore_excludes(path, root_folder, relative_to):
-    """Return a list of excludes from all .gitignore files found in `path`."""
+    The `entries` are tuples ``(file, arcname)`` as yielded by
+    :func:`_iter_entries`, so that the .gitignore files are found without
+    walking the folders a second time.
+    """
     exclude = []
-    if path.is_dir():
-        for gitignore in path.glob('**/.gitignore'):
+    for (file, arcname) in entries:
+        folder, name = os.path.split(arcname)
+        if name == ".gitignore":
             exclude += _get_single_gitignore_excludes(
-                gitignore, root_folder=root_folder, relative_to=relative_to
+                file, prefix=(folder or os.curdir)
             )
-    elif path.name == ".gitignore":
-        exclude += _get_single_gitignore_excludes(
-            path, root_folder=root_folder, relative_to=relative_to
-        )
     return exclude
 
 
@@ -198,6 +363,9 @@ def zip_files(
     exclude_git_ignores,
     outfile,
     files,
+    jobs=1,
+    compresslevel=None,
+    solid=False,
 ):
     """Compress list of `files`.
 
@@ -207,7 +375,10 @@ def zip_files(
             the zip archive
         compression (int): Zip compression. One of :obj:`zipfile.ZIP_STORED`
             :obj:`zipfile.ZIP_DEFLATED`, :obj:`zipfile.ZIP_BZIP2`,
-            :obj:`zipfile.ZIP_LZMA`
+            :obj:`zipfile.ZIP_LZMA`, or
+            :obj:`~zip_files.zipfile_extensions.ZIP_ZSTANDARD`. Files that
+            are already compressed (based on their suffix, e.g. '.jpg' or
+            '.zip') are always stored without compression.
         exclude (list[str]): A list of glob patterns to exclude. Matching is
             done from the right on the path names inside the zip archive.
             Patterns must be relative (not start with a slash)
@@ -221,19 +392,26 @@ def zip_files(
             '.gitmodules' '.gitattributes' for Git
         exclude_git_ignores (bool): If given as True, exclude files listed in
             any '.gitignore' in the given `files` or its subfolders.
-        outfile (Path): The path of the zip file to be written
-        files (Iterable[Path]): The files to include in the zip archive
+        outfile (Path or file-like): The path of the zip file to be written,
+            or a binary file-like object to write the zip file to (which is
+            not closed). If None or ``'--'``, write to stdout.
+        files (Iterable[str or Path]): The files to include in the zip
+            archive
+        jobs (int): The number of processes to use for compression. If 1,
+            compress in the current process. If 0, use one process per CPU.
+        compresslevel (int or None): The compression level, with the same
+            meaning as for :class:`zipfile.ZipFile`. If None, use the default
+            level for `compression`.
+        solid (bool): If True, pack all files into a single tar archive,
+            which is added to the zip archive as one entry, cf.
+            :func:`_solid_arcname`. This ignores `jobs`.
     """
-    logger = logging.getLogger(__name__)
     if debug:
         logger.setLevel(logging.DEBUG)
         logger.debug("Enabled debug output")
     files = list(files)  # generator->list, so we can consume it multiple times
     logger.debug("root_folder: %s", root_folder)
     logger.debug("Writing zip file to %s", outfile)
-    if outfile is None or outfile == '--':
-        logger.debug("Routing output to stdout (from %r)", outfile)
-        outfile = click.get_binary_stream('stdout')
     exclude = list(exclude)  # make a copy
     for file in exclude_from:
         logger.debug("Reading exclude patterns from: %s", file)
@@ -241,77 +419,406 @@ def zip_files(
             exclude += in_fh.read().splitlines()
     if exclude_vcs:
         exclude += _VCS_EXCLUDES
+    entries = _iter_entries(files, root_folder)
     if exclude_git_ignores:
-        for path in files:
-            exclude += _get_gitignore_excludes(
-                path, root_folder=root_folder, relative_to=path.parent
-            )
+        entries = list(entries)  # walk the folders only once
+        exclude += _get_gitignore_excludes(entries)
     if len(exclude) > 0:
-        logger.debug("Using effective excludes: %r", (exclude,))
-    with ZipFile(outfile, mode='w', compression=compression) as zipfile:
-        for file in files:
-            _add_to_zip(
-                zipfile,
-                file,
-                root_folder,
-                exclude,
-                exclude_dotfiles,
-                relative_to=file.parent,
-                compression=compression,
+        n_exclude = len(exclude)
+        # Compiled regexes compare equal if their pattern and flags are equal
+        exclude = list(dict.fromkeys(exclude))
+        logger.debug(
+            "Using effective excludes (%d of %d unique): %r",
+            len(exclude),
+            n_exclude,
+            (exclude,),
+        )
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    logger.debug("Using %d job(s) for compression", jobs)
+    logger.debug("Using compression level %s", compresslevel)
+    is_excluded = _Excluder(exclude, exclude_dotfiles)
+    entries = (entry for entry in entries if not is_excluded(entry[1]))
+    with _open_outfile(outfile) as out_fh, ZipFile(
+        out_fh, mode='w', compression=compression, compresslevel=compresslevel
+    ) as zipfile:
+        if solid:
+            _add_to_zip_solid(
+                zipfile, entries, _solid_arcname(outfile), compression
+            )
+        elif jobs == 1:
+            for (file, zinfo, data) in _read_ahead(entries, compression):
+                _add_to_zip(zipfile, file, zinfo, data)
+        else:
+            _add_to_zip_parallel(
+                zipfile, entries, compression, compresslevel, jobs
             )
     logger.debug("Done")
 
 
-def _add_to_zip(
-    zipfile,
-    file,
-    root_folder,
-    exclude,
-    exclude_dotfiles,
-    relative_to,
-    compression,
-):
-    """Recursively add the `file` to the (open) `zipfile`."""
-    logger = logging.getLogger(__name__)
-    if file.is_file():
-        if root_folder is None:
-            filename = file.relative_to(relative_to)
-        else:
-            filename = root_folder / file.relative_to(relative_to)
-        data = file.read_bytes()
-        if exclude_dotfiles and filename.stem.startswith("."):
-            logger.debug("Skipping %s (exclude dotfiles)", filename)
-            return
+@contextmanager
+def _open_outfile(outfile):
+    """Open `outfile` for writing with a large buffer.
+
+    If `outfile` is None or ``'--'``, the buffer wraps the binary stdout
+    stream, which is flushed but not closed on exit. If `outfile` is already
+    a binary file-like object, it is used as-is, and not closed on exit.
+    """
+    if hasattr(outfile, 'write'):
+        yield outfile
+    elif outfile is None or outfile == '--':
+        logger.debug("Routing output to stdout (from %r)", outfile)
+        out_fh = io.BufferedWriter(
+            click.get_binary_stream('stdout'), buffer_size=_OUTPUT_BUFSIZE
+        )
+        try:
+            yield out_fh
+        finally:
+            out_fh.flush()
+            out_fh.detach()
+    else:
+        with open(outfile, 'wb', buffering=_OUTPUT_BUFSIZE) as out_fh:
+            yield out_fh
+
+
+def _iter_entries(files, root_folder):
+    """Iterate over all files that may be added to the zip archive.
+
+    Yields tuples ``(file, arcname)`` where `file` is a path on disk, and
+    `arcname` is the corresponding path inside the zip archive. Folders in
+    `files` are traversed recursively. No excludes are applied.
+    """
+    if root_folder is not None:  # may be a str or a Path
+        root_folder = os.path.normpath(os.fspath(root_folder))
+        if root_folder == os.curdir:
+            root_folder = ''
+    for file in files:
+        name = os.path.basename(os.path.normpath(file))
+        if name == os.curdir:
+            name = ''
+        arcname = os.sep.join(part for part in (root_folder, name) if part)
+        yield from walk(os.fspath(file), arcname)
+
+
+class _Excluder:
+    """Callable that checks whether an arcname is excluded.
+
+    Args:
+        exclude (list): Compiled regexes and glob patterns (strings) to
+            exclude. Regexes must match the entire arcname, glob patterns are
+            matched from the right, cf. :meth:`pathlib.PurePath.match`.
+        exclude_dotfiles (bool): Whether to exclude all files starting with a
+            dot.
+
+    Glob patterns are translated to regexes (cf. :func:`glob_to_regex`), and
+    all regexes are combined into a single alternation, so that each arcname
+    is scanned only once, independent of the number of patterns, if the
+    optional ``google-re2`` package is installed.
+    """
+
+    def __init__(self, exclude, exclude_dotfiles):
+        self.exclude_dotfiles = exclude_dotfiles
+        self.regexes = []
+        self._descriptions = []  # for debug messages
         for pattern in exclude:
             if isinstance(pattern, RegexPattern):
-                if pattern.match(str(filename)):
-                    logger.debug(
-                        "Skipping %s (exclude RX %r)",
-                        filename,
-                        pattern.pattern,
-                    )
-                    return
+                self.regexes.append(pattern)
+                self._descriptions.append("RX %r" % pattern.pattern)
             elif isinstance(pattern, str):
-                if filename.match(pattern):
-                    logger.debug(
-                        "Skipping %s (exclude pattern %r)", filename, pattern
-                    )
-                    return
+                self.regexes.append(_compile_cached(glob_to_regex(pattern)))
+                self._descriptions.append("pattern %r" % pattern)
             else:
                 raise TypeError("Invalid type for pattern %r" % pattern)
-        logger.debug("Adding %s to zip as %s", file, filename)
-        zinfo = ZipInfo.from_file(file, arcname=str(filename))
-        zinfo.compress_type = compression
-        zipfile.writestr(zinfo, data)
-    elif file.is_dir():
-        directory = file
-        for file_in_dir in directory.iterdir():
-            _add_to_zip(
-                zipfile,
-                file_in_dir,
-                root_folder,
-                exclude,
-                exclude_dotfiles,
-                relative_to,
-                compression,
+        self._matchers = _combine_regexes(self.regexes)
+
+    def __call__(self, arcname):
+        """Return True if `arcname` is excluded."""
+        if self.exclude_dotfiles:
+            if os.path.basename(arcname).startswith("."):
+                logger.debug("Skipping %s (exclude dotfiles)", arcname)
+                return True
+        try:
+            matched = any(rx.match(arcname) for rx in self._matchers)
+        except UnicodeEncodeError:  # RE2 cannot handle undecodable filenames
+            matched = any(rx.match(arcname) for rx in self.regexes)
+        if matched and logger.isEnabledFor(logging.DEBUG):
+            description = next(
+                description
+                for (rx, description) in zip(self.regexes, self._descriptions)
+                if rx.match(arcname)
             )
+            logger.debug("Skipping %s (exclude %s)", arcname, description)
+        return matched
+
+
+def _combine_regexes(regexes):
+    """Combine compiled `regexes` into as few regexes as possible.
+
+    Returns a list of compiled regexes, such that a string matches any of them
+    if and only if it matches any of the `regexes`. Regexes with the same
+    flags are joined into an alternation. Regexes that cannot be joined
+    (because they contain groups, whose numbering would change, or global
+    inline flags) are returned unchanged.
+    """
+    by_flags = {}
+    combined = []
+    for rx in regexes:
+        if rx.groups > 0:
+            combined.append(rx)
+        else:
+            by_flags.setdefault(rx.flags, []).append(rx)
+    for (flags, group) in by_flags.items():
+        if len(group) == 1:
+            combined.extend(group)
+            continue
+        pattern = "|".join("(?:%s)" % rx.pattern for rx in group)
+        try:
+            combined.append(_compile(pattern, flags))
+        except re.error:
+            combined.extend(group)
+    return combined
+
+
+def _compile(pattern, flags):
+    """Compile the regex `pattern`, with RE2 if possible.
+
+    RE2 (from the optional ``google-re2`` package) matches in linear time,
+    which is much faster than :mod:`re` for large alternations. It is used
+    only for patterns with default flags, and :mod:`re` is used as a
+    fallback for any pattern that RE2 does not support (e.g. lookaheads), or
+    that needs more than ``_RE2_MAX_MEM`` bytes of memory.
+    """
+    if re2 is not None and flags == re.UNICODE:  # default flags
+        options = re2.Options()
+        options.max_mem = _RE2_MAX_MEM
+        options.never_capture = True  # only ever used for a yes/no match
+        options.log_errors = False  # don't print unsupported patterns
+        try:
+            return re2.compile(pattern, options)
+        except re2.error:
+            logger.debug("Cannot compile %r with RE2", pattern)
+    return re.compile(pattern, flags)
+
+
+def _compress_type(arcname, compression):
+    """Return the compression method for the zip entry `arcname`.
+
+    This is `compression`, except for files with a suffix listed in
+    ``_STORED_SUFFIXES``: these are already compressed, so compressing them
+    again would cost time without making them any smaller.
+    """
+    if os.path.splitext(arcname)[1].lower() in _STORED_SUFFIXES:
+        return ZIP_STORED
+    return compression
+
+
+def _zip_info(file, arcname, compression):
+    """Create the :class:`zipfile.ZipInfo` for adding `file` as `arcname`.
+
+    The entry uses the compression level of the zip archive it is written
+    to, cf. :class:`.zipfile_extensions.ZipFile`.
+    """
+    zinfo = ZipInfo.from_file(file, arcname=arcname)
+    zinfo.compress_type = _compress_type(arcname, compression)
+    return zinfo
+
+
+def _read_ahead(entries, compression):
+    """Iterate over `entries`, reading small files in a background thread.
+
+    The `entries` are tuples ``(file, arcname)``, as yielded by
+    :func:`_iter_entries`. Yields tuples ``(file, zinfo, data)`` with the
+    :class:`zipfile.ZipInfo` for the entry, and the content of `file`, or
+    None if `file` is larger than ``_READ_AHEAD_MAX_SIZE`` and should be
+    streamed instead. Up to ``_READ_AHEAD_QUEUE_SIZE`` entries are read
+    while the caller is still busy compressing the previous ones.
+    """
+    items = queue.Queue(maxsize=_READ_AHEAD_QUEUE_SIZE)
+    stop = threading.Event()
+
+    def reader():
+        try:
+            for (file, arcname) in entries:
+                if stop.is_set():
+                    return
+                zinfo = _zip_info(file, arcname, compression)
+                data = None
+                if zinfo.file_size <= _READ_AHEAD_MAX_SIZE:
+                    with open(file, 'rb') as in_fh:
+                        data = in_fh.read()
+                items.put((file, zinfo, data))
+            items.put(None)
+        except BaseException as exc:
+            items.put(exc)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is None:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        while thread.is_alive():  # unblock a reader waiting for a free slot
+            try:
+                items.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def _add_to_zip(zipfile, file, zinfo, data=None):
+    """Add the `file` to the (open) `zipfile`, as described by `zinfo`.
+
+    If given, `data` must be the content of `file`. Otherwise, `file` is
+    streamed into the zip archive.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Adding %s to zip as %s", file, zinfo.filename)
+    if data is None:
+        with open(file, 'rb', buffering=0) as src:
+            _fadvise(src, 'POSIX_FADV_SEQUENTIAL')
+            with zipfile.open(zinfo, mode='w') as dest:
+                _copy_to_zip(src, dest, zinfo.file_size)
+            _fadvise(src, 'POSIX_FADV_DONTNEED')  # will not be read again
+    else:
+        zipfile.writestr(zinfo, data)
+
+
+def _fadvise(fh, advice):
+    """Declare an access pattern for the open file `fh` to the kernel.
+
+    The `advice` is the name of one of the ``os.POSIX_FADV_*`` constants. On
+    platforms without :func:`os.posix_fadvise`, this does nothing.
+    """
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fh.fileno(), 0, 0, getattr(os, advice))
+        except OSError as exc:
+            logger.debug("Cannot fadvise %s: %s", fh.name, exc)
+
+
+def _copy_to_zip(src, dest, size):
+    """Copy the content of the open file `src` to the zip entry `dest`.
+
+    If the `size` of `src` is at least ``_MMAP_MIN_SIZE``, `src` is
+    memory-mapped, and `dest` receives :class:`memoryview` slices of the
+    mapping, saving a copy of the data. Otherwise, or if `src` cannot be
+    mapped, it is read in chunks.
+    """
+    if size >= _MMAP_MIN_SIZE:
+        try:
+            mapped = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            logger.debug("Cannot mmap %s, reading in chunks", src.name)
+        else:
+            with mapped:
+                if hasattr(mmap, 'MADV_SEQUENTIAL'):  # Python >= 3.8, Unix
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(mapped) as view:
+                    for offset in range(0, len(view), _COPY_BUFSIZE):
+                        dest.write(view[offset : offset + _COPY_BUFSIZE])
+            return
+    shutil.copyfileobj(src, dest, _COPY_BUFSIZE)
+
+
+def _solid_arcname(outfile):
+    """Name of the tar archive inside the zip file `outfile` for `solid`.
+
+    This is the stem of `outfile` with a ".tar" extension, or "archive.tar"
+    if `outfile` is None or ``'--'`` (stdout), or a file-like object without
+    a file name.
+    """
+    if hasattr(outfile, 'write'):
+        outfile = getattr(outfile, 'name', None)
+    if not isinstance(outfile, (str, os.PathLike)) or outfile == '--':
+        return 'archive.tar'
+    return Path(outfile).stem + '.tar'
+
+
+def _add_to_zip_solid(zipfile, entries, arcname, compression):
+    """Add all `entries` to the (open) `zipfile` as a single tar archive.
+
+    The `entries` are tuples ``(file, arcname)``, as yielded by
+    :func:`_iter_entries`. The tar archive is streamed into the zip entry
+    `arcname`, so that it is compressed as a whole.
+    """
+    zinfo = ZipInfo(arcname, date_time=time.localtime()[:6])
+    zinfo.external_attr = (stat.S_IFREG | 0o644) << 16
+    zinfo.compress_type = compression
+    debug = logger.isEnabledFor(logging.DEBUG)
+    with zipfile.open(zinfo, mode='w', force_zip64=True) as dest:
+        with tarfile.open(
+            fileobj=dest,
+            mode='w|',
+            format=tarfile.PAX_FORMAT,
+            dereference=True,
+        ) as tar:
+            for (file, name) in entries:
+                if debug:
+                    logger.debug("Adding %s to %s as %s", file, arcname, name)
+                tar.add(file, arcname=name, recursive=False)
+
+
+def _write_shard(entries, shard, compression, compresslevel):
+    """Write a zip archive `shard` containing `entries` (in a worker process).
+
+    Returns `shard`.
+    """
+    with ZipFile(
+        shard, mode='w', compression=compression, compresslevel=compresslevel
+    ) as zipfile:
+        for (file, zinfo, data) in _read_ahead(entries, compression):
+            _add_to_zip(zipfile, file, zinfo, data)
+    return shard
+
+
+def _split_entries(entries, n):
+    """Split `entries` into up to `n` consecutive chunks of similar size.
+
+    The size of a chunk is the total size of the files in it. No chunk is
+    empty.
+    """
+    if len(entries) == 0:
+        return []
+    sizes = [os.path.getsize(file) for (file, _) in entries]
+    target = sum(sizes) / n
+    chunks = [[]]
+    total = 0
+    for (entry, size) in zip(entries, sizes):
+        if chunks[-1] and len(chunks) < n and total >= target * len(chunks):
+            chunks.append([])
+        chunks[-1].append(entry)
+        total += size
+    return chunks
+
+
+def _add_to_zip_parallel(zipfile, entries, compression, compresslevel, jobs):
+    """Add all `entries` to the (open) `zipfile`, using `jobs` processes.
+
+    The `entries` are tuples ``(file, arcname)``, as yielded by
+    :func:`_iter_entries`. They are split into ``_SHARDS_PER_JOB * jobs``
+    consecutive chunks, each of which is written to a separate temporary zip
+    archive ("shard") by a worker process. The entries of the shards are then
+    copied to `zipfile` in order, without recompressing them.
+    """
+    chunks = _split_entries(list(entries), _SHARDS_PER_JOB * jobs)
+    with tempfile.TemporaryDirectory(prefix='zip_files_') as tempdir:
+        shards = [
+            os.path.join(tempdir, 'shard%d.zip' % i)
+            for i in range(len(chunks))
+        ]
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for shard in executor.map(
+                _write_shard,
+                chunks,
+                shards,
+                repeat(compression),
+                repeat(compresslevel),
+            ):
+                logger.debug("Copying entries from %s", shard)
+                zipfile.copy_entries(shard)
+                os.remove(shard)
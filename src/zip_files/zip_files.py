@@ -7,6 +7,7 @@ import click
 from . import __version__
 from .backend import zip_files as _zip_files
 from .click_extensions import DependsOn, activate_debug_logger
+from .zipfile_extensions import ZIP_ZSTANDARD, enable_zstandard
 
 
 __all__ = []
@@ -17,8 +18,43 @@ _COMPRESSION = {  # possible values for --compression
     'deflated': ZIP_DEFLATED,
     'bzip2': ZIP_BZIP2,
     'lzma': ZIP_LZMA,
+    'zstd': ZIP_ZSTANDARD,
 }
 
+_LEVELS = {  # valid values for --level, depending on --compression
+    'deflated': range(0, 10),
+    'bzip2': range(1, 10),
+    'zstd': range(1, 23),
+}
+
+
+def _check_compression(compression, level):
+    """Check that `compression` is available and supports `level`.
+
+    Return the :mod:`zipfile` compression constant for the `compression`
+    name, or raise :exc:`click.BadParameter`.
+    """
+    compression = compression.lower()
+    if compression == 'zstd':
+        try:
+            enable_zstandard()
+        except RuntimeError as exc:
+            raise click.BadParameter(str(exc), param_hint="'--compression'")
+    if level is not None:
+        levels = _LEVELS.get(compression)
+        if levels is None:
+            raise click.BadParameter(
+                "%s compression does not support levels" % compression,
+                param_hint="'--level'",
+            )
+        if level not in levels:
+            raise click.BadParameter(
+                "%s compression requires a level from %d to %d"
+                % (compression, levels[0], levels[-1]),
+                param_hint="'--level'",
+            )
+    return _COMPRESSION[compression]
+
 
 @click.command()
 @click.help_option('--help', '-h')
@@ -43,7 +79,45 @@ _COMPRESSION = {  # possible values for --compression
         '"bzip2": BZIP2 compression method (part of the zip standard since '
         '2001); '
         '"lzma": LZMA compression method (part of the zip standard since '
-        '2006).'
+        '2006); '
+        '"zstd": Zstandard compression method (part of the zip standard '
+        'since 2020, requires Python >= 3.14 or the zipfile-zstd package).'
+    ),
+)
+@click.option(
+    '--level',
+    '-l',
+    type=int,
+    metavar='LEVEL',
+    help=(
+        "Compression level: 0-9 for \"deflated\", 1-9 for \"bzip2\", and "
+        "1-22 for \"zstd\", with higher levels compressing better but more "
+        "slowly. By default, use the default level of the compression "
+        "method."
+    ),
+)
+@click.option(
+    '--jobs',
+    '-j',
+    type=click.IntRange(min=0),
+    default=1,
+    show_default=True,
+    metavar='N',
+    help=(
+        "Number of processes to use for compressing files in parallel. "
+        "A value of 0 uses one process per CPU."
+    ),
+)
+@click.option(
+    '--solid',
+    is_flag=True,
+    help=(
+        "Pack all files into a single tar archive, which is stored in the "
+        "zip file as one entry, compressed as a whole. This results in "
+        "faster and better compression for many small files, but the files "
+        "must be extracted from the tar archive after unzipping. The tar "
+        "archive is named after OUTFILE, or \"archive.tar\" when writing to "
+        "stdout. Implies --jobs=1."
     ),
 )
 @click.option(
@@ -125,6 +199,9 @@ def zip_files(
     auto_root,
     root_folder,
     compression,
+    level,
+    jobs,
+    solid,
     exclude,
     exclude_from,
     exclude_dotfiles,
@@ -136,13 +213,13 @@ def zip_files(
     """Create a zip file containing FILES."""
     if debug:
         activate_debug_logger()
-    files = [Path(f) for f in files]
     if auto_root:
         root_folder = Path(outfile).stem
     _zip_files(
         debug=debug,
         root_folder=root_folder,
-        compression=_COMPRESSION[compression.lower()],
+        compression=_check_compression(compression, level),
+        compresslevel=level,
         exclude=exclude,
         exclude_from=exclude_from,
         exclude_dotfiles=exclude_dotfiles,
@@ -150,4 +227,6 @@ def zip_files(
         exclude_git_ignores=exclude_git_ignores,
         outfile=outfile,
         files=files,
+        jobs=jobs,
+        solid=solid,
     )
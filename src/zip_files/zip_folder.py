@@ -1,4 +1,5 @@
 """``zip-folder`` command line utility."""
+import os
 from pathlib import Path
 
 import click
@@ -6,7 +7,7 @@ import click
 from . import __version__
 from .backend import zip_files as _zip_files
 from .click_extensions import DependsOn, activate_debug_logger, help_from_cmd
-from .zip_files import _COMPRESSION, zip_files
+from .zip_files import _COMPRESSION, _check_compression, zip_files
 
 
 __all__ = []
@@ -36,6 +37,17 @@ _help = help_from_cmd(zip_files)
     show_default=True,
     help=_help('compression'),
 )
+@click.option('--level', '-l', type=int, metavar='LEVEL', help=_help('level'))
+@click.option(
+    '--jobs',
+    '-j',
+    type=click.IntRange(min=0),
+    default=1,
+    show_default=True,
+    metavar='N',
+    help=_help('jobs'),
+)
+@click.option('--solid', is_flag=True, help=_help('solid'))
 @click.option(
     '--auto-root',
     '-a',
@@ -86,6 +98,9 @@ def zip_folder(
     auto_root,
     root_folder,
     compression,
+    level,
+    jobs,
+    solid,
     exclude,
     exclude_from,
     exclude_dotfiles,
@@ -97,7 +112,7 @@ def zip_folder(
     """Create a zip file containing the FOLDER."""
     if debug:
         activate_debug_logger()
-    files = Path(folder).iterdir()
+    files = [os.path.join(folder, name) for name in os.listdir(folder)]
     if root_folder is None:
         root_folder = Path(folder).name
         if auto_root:
@@ -105,7 +120,8 @@ def zip_folder(
     _zip_files(
         debug=debug,
         root_folder=root_folder,
-        compression=_COMPRESSION[compression.lower()],
+        compression=_check_compression(compression, level),
+        compresslevel=level,
         exclude=exclude,
         exclude_from=exclude_from,
         exclude_dotfiles=exclude_dotfiles,
@@ -113,4 +129,6 @@ def zip_folder(
         exclude_git_ignores=exclude_git_ignores,
         outfile=outfile,
         files=files,
+        jobs=jobs,
+        solid=solid,
     )
@@ -0,0 +1,267 @@
+"""Project-specific extensions for :mod:`zipfile`."""
+import bz2
+import copy
+import struct
+import zipfile
+from zipfile import ZIP_BZIP2, ZIP_DEFLATED
+
+
+try:
+    import deflate as _libdeflate
+except ImportError:
+    _libdeflate = None
+
+try:
+    from isal import isal_zlib as _isal_zlib
+except ImportError:
+    _isal_zlib = None
+
+try:
+    from zlib_ng import zlib_ng as _zlib
+except ImportError:
+    import zlib as _zlib
+
+
+__all__ = [
+    'ZIP_ZSTANDARD',
+    'ZipFile',
+    'crc32',
+    'enable_zstandard',
+    'get_compressor',
+]
+
+#: Compression method number for Zstandard (cf. APPNOTE.TXT, section 4.4.5)
+ZIP_ZSTANDARD = 93
+
+# Maximum size of data to be compressed (in memory) with libdeflate
+_LIBDEFLATE_MAX_SIZE = 16 * 1024 * 1024
+
+# Bit in the general purpose flags of an entry that uses a data descriptor
+_FLAG_DATA_DESCRIPTOR = 0x08
+
+# Compression levels for which ISA-L is used (ISA-L level 0 is not the same
+# as zlib level 0, and levels > 3 are not supported)
+_ISAL_LEVELS = (1, 2, 3)
+
+#: The fastest available implementation of :func:`zlib.crc32`
+crc32 = _zlib.crc32
+if _libdeflate is not None:
+    crc32 = _libdeflate.crc32
+elif _isal_zlib is not None:
+    crc32 = _isal_zlib.crc32
+
+
+def enable_zstandard():
+    """Enable support for :obj:`ZIP_ZSTANDARD` in :mod:`zipfile`.
+
+    This is built into :mod:`zipfile` for Python >= 3.14. For older versions
+    of Python, the optional ``zipfile-zstd`` package is imported, which
+    patches :mod:`zipfile` accordingly.
+
+    Raises:
+        RuntimeError: If Zstandard compression is not available.
+    """
+    if getattr(zipfile, 'ZIP_ZSTANDARD', None) == ZIP_ZSTANDARD:
+        return
+    try:
+        import zipfile_zstd  # noqa: F401
+    except ImportError:
+        raise RuntimeError(
+            "Zstandard compression requires Python >= 3.14 or the "
+            "zipfile-zstd package"
+        )
+
+
+class _LibdeflateCompressor:
+    """Compressor producing raw DEFLATE data through libdeflate.
+
+    This implements the same interface as :func:`zlib.compressobj`. Since
+    libdeflate only operates on complete buffers, all data passed to
+    :meth:`compress` is collected, and then compressed in one go by
+    :meth:`flush`.
+    """
+
+    def __init__(self, compresslevel=None):
+        if compresslevel is None:
+            compresslevel = -1  # libdeflate's default level
+        self._compresslevel = compresslevel
+        self._buffer = bytearray()
+
+    def compress(self, data):
+        """Collect `data` for compression."""
+        self._buffer += data
+        return b''
+
+    def flush(self):
+        """Return the compressed data for everything passed to `compress`."""
+        data, self._buffer = self._buffer, bytearray()
+        return bytes(_libdeflate.deflate_compress(data, self._compresslevel))
+
+
+def get_compressor(compress_type, compresslevel=None, size=None):
+    """Return the fastest available compressor object for `compress_type`.
+
+    For :obj:`zipfile.ZIP_DEFLATED`, this uses libdeflate if the optional
+    ``deflate`` package is installed, ISA-L for `compresslevel` 1 to 3 if the
+    optional ``isal`` package is installed, or zlib-ng if the optional
+    ``zlib-ng`` package is installed. Otherwise, or for any other
+    `compress_type`, it
+    falls back to the compressor that :mod:`zipfile` would use. A
+    :obj:`zipfile.ZIP_STORED` `compress_type` results in None.
+
+    Since libdeflate must hold all data in memory, it is only used if the
+    `size` of the data to be compressed is known, and not larger than
+    ``_LIBDEFLATE_MAX_SIZE``.
+    """
+    if compress_type == ZIP_DEFLATED:
+        use_libdeflate = (
+            _libdeflate is not None
+            and size is not None
+            and size <= _LIBDEFLATE_MAX_SIZE
+        )
+        if use_libdeflate:
+            return _LibdeflateCompressor(compresslevel)
+        if _isal_zlib is not None and compresslevel in _ISAL_LEVELS:
+            return _isal_zlib.compressobj(
+                compresslevel, _isal_zlib.DEFLATED, -15
+            )
+        if compresslevel is None:
+            compresslevel = _zlib.Z_DEFAULT_COMPRESSION
+        return _zlib.compressobj(compresslevel, _zlib.DEFLATED, -15)
+    if compress_type == ZIP_BZIP2 and compresslevel is not None:
+        return bz2.BZ2Compressor(compresslevel)
+    if compress_type == ZIP_ZSTANDARD:
+        enable_zstandard()
+    else:  # `compresslevel` is ignored for ZIP_STORED and ZIP_LZMA
+        compresslevel = None
+    if compresslevel is None:  # Python 3.6 does not support `compresslevel`
+        return zipfile._get_compressor(compress_type)
+    return zipfile._get_compressor(compress_type, compresslevel)
+
+
+def _copy_bytes(src, dest, size, bufsize=1024 * 1024):
+    """Copy exactly `size` bytes from the file `src` to the file `dest`."""
+    while size > 0:
+        data = src.read(min(size, bufsize))
+        if not data:
+            raise EOFError("Truncated zip archive")
+        dest.write(data)
+        size -= len(data)
+
+
+class _ZipWriteFile(zipfile._ZipWriteFile):
+    """Zip entry opened for writing, checksummed through :func:`crc32`.
+
+    This is the same as the :mod:`zipfile` original, which uses the
+    :func:`crc32` of the standard library. Reading an archive, or writing
+    through any other :class:`zipfile.ZipFile`, is not affected.
+    """
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+        # Accept any data that supports the buffer protocol
+        if isinstance(data, (bytes, bytearray)):
+            nbytes = len(data)
+        else:
+            data = memoryview(data)
+            nbytes = data.nbytes
+        self._file_size += nbytes
+        self._crc = crc32(data, self._crc)
+        if self._compressor:
+            data = self._compressor.compress(data)
+            self._compress_size += len(data)
+        self._fileobj.write(data)
+        return nbytes
+
+
+class ZipFile(zipfile.ZipFile):
+    """A :class:`zipfile.ZipFile` that writes through :func:`get_compressor`.
+
+    The resulting archives are identical in format to those written by
+    :class:`zipfile.ZipFile`, but compression and checksums may use a faster
+    implementation than the standard library's, cf. :func:`crc32`. Also,
+    :obj:`ZIP_ZSTANDARD` may be used as a `compression` if it is available,
+    cf. :func:`enable_zstandard`.
+
+    The `compresslevel` applies to all entries that are written without a
+    compression level of their own, including entries written through
+    :meth:`open` with a :class:`zipfile.ZipInfo`. Unlike for
+    :class:`zipfile.ZipFile`, this also works on Python 3.6.
+    """
+
+    def __init__(
+        self,
+        file,
+        mode="r",
+        compression=zipfile.ZIP_STORED,
+        compresslevel=None,
+        **kw
+    ):
+        if compression == ZIP_ZSTANDARD:
+            enable_zstandard()
+        # Python 3.6 does not support `compresslevel`, so we handle it here
+        super().__init__(file, mode=mode, compression=compression, **kw)
+        self.compresslevel = compresslevel
+
+    def _open_to_write(self, zinfo, force_zip64=False):
+        dest = super()._open_to_write(zinfo, force_zip64=force_zip64)
+        dest.__class__ = _ZipWriteFile  # only overrides `write`
+        compresslevel = getattr(zinfo, '_compresslevel', None)
+        if compresslevel is None:
+            compresslevel = self.compresslevel
+        # A `file_size` of 0 may mean that the size is not known in advance
+        dest._compressor = get_compressor(
+            zinfo.compress_type,
+            compresslevel,
+            size=(zinfo.file_size or None),
+        )
+        return dest
+
+    def copy_entries(self, source):
+        """Append all entries of the zip archive `source`, as they are.
+
+        The raw (compressed) data of each entry is copied, without
+        decompressing or recompressing it. The entries in `source` must not
+        use data descriptors, which is the case for any archive that was
+        written to a seekable file.
+
+        Args:
+            source (str or pathlib.Path or file-like): The zip archive from
+                which to copy all entries
+        """
+        if self._writing:
+            raise ValueError(
+                "Can't write to ZIP archive while an open writing handle "
+                "exists"
+            )
+        with zipfile.ZipFile(source) as src, self._lock:
+            for info in src.infolist():
+                if info.flag_bits & _FLAG_DATA_DESCRIPTOR:
+                    raise ValueError(
+                        "Cannot copy entry %r with data descriptor"
+                        % info.filename
+                    )
+                zinfo = copy.copy(info)
+                self._writecheck(zinfo)
+                src.fp.seek(info.header_offset)
+                header = src.fp.read(zipfile.sizeFileHeader)
+                fheader = struct.unpack(zipfile.structFileHeader, header)
+                if fheader[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+                    raise zipfile.BadZipFile(
+                        "Bad magic number for file header"
+                    )
+                size = (
+                    fheader[zipfile._FH_FILENAME_LENGTH]
+                    + fheader[zipfile._FH_EXTRA_FIELD_LENGTH]
+                    + info.compress_size
+                )
+                if self._seekable:
+                    self.fp.seek(self.start_dir)
+                zinfo.header_offset = self.fp.tell()
+                self.fp.write(header)
+                _copy_bytes(src.fp, self.fp, size)
+                self.start_dir = self.fp.tell()
+                self.filelist.append(zinfo)
+                self.NameToInfo[zinfo.filename] = zinfo
+                self._didModify = True
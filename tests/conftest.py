@@ -0,0 +1,39 @@
+"""Shared fixtures for the tests."""
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+
+ROOT = Path(__file__).parent / 'root'
+
+
+@pytest.fixture(scope='session')
+def my_documents_entries():
+    """Names of the files in the "My Documents" test folder."""
+    folder = ROOT / 'user' / 'folder'
+    with os.scandir(folder / 'My Documents') as entries:
+        return tuple(entry.name for entry in entries)
+
+
+@pytest.fixture(scope='session')
+def git_excludes_folder(tmp_path_factory):
+    """Copy of "folder_with_git_excludes", with the git-ignored files added.
+
+    The tests must not modify this folder, as it is shared between them.
+    """
+    root = tmp_path_factory.mktemp('git_excludes') / 'folder_with_git_excludes'
+    shutil.copytree(ROOT / 'folder_with_git_excludes', root)
+    for file in root.glob('**/*.py'):
+        shutil.copy(file, file.with_suffix('.pyc'))
+    for file in root.glob('**/Makefile.in'):
+        shutil.copy(file, file.parent / 'Makefile')
+    for (i, file) in enumerate(['file1.rst', 'file2.rst'], start=1):
+        (root / 'docs' / 'sources' / 'API' / file).write_text("file %d" % i)
+    (root / "venv").mkdir()
+    (root / "venv" / "README.md").write_text("# This is a virtual env")
+    (root / 'docs' / '_build').mkdir()
+    (root / 'docs' / '_build' / 'build.log').write_text("# build log")
+    (root / 'docs' / '_build' / 'index.html').write_text("# HTML")
+    return root
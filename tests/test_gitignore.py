@@ -4,10 +4,11 @@ Note: run pytest with --log-cli-level=DEBUG to see logging messages
 """
 import os
 import re
+from pathlib import PurePath
 
 import pytest
 
-from zip_files.backend import gitignore_to_regex
+from zip_files.backend import _Excluder, gitignore_to_regex, glob_to_regex
 
 
 def _path(unix_path):
@@ -61,3 +62,46 @@ def test_gitignore_to_regex(prefix, pattern, path, matches):
     rx = re.compile(regex)
     match = rx.match(path)
     assert bool(match) == matches
+
+
+GLOBS = ['*.txt', 'b/*', '*/b/*.txt', 'a?.txt', '[!a]*', '[]-]*', 'b', '/b']
+PATHS = ['a.txt', 'b', 'a/b', 'a/b/c.txt', 'ab.txt', 'ba.txt', ']', 'a/-.txt']
+
+
+@pytest.mark.parametrize("glob", GLOBS)
+def test_glob_to_regex(glob):
+    """Test that `glob_to_regex` matches like :meth:`PurePath.match`."""
+    rx = re.compile(glob_to_regex(glob))
+    for path in PATHS:
+        path = _path(path)
+        assert bool(rx.match(path)) == PurePath(path).match(glob)
+    with pytest.raises(ValueError):
+        glob_to_regex('')
+
+
+def test_excluder():
+    """Test that `_Excluder` matches like the individual patterns."""
+    regexes = [
+        re.compile(gitignore_to_regex(prefix, pattern))
+        for (prefix, pattern, _, _) in TESTS
+    ]
+    is_excluded = _Excluder(regexes + ['*.txt'], exclude_dotfiles=False)
+    for (_, _, path, _) in TESTS:
+        expected = any(rx.match(path) for rx in regexes)
+        expected = expected or path.endswith('.txt')
+        assert is_excluded(path) == expected
+    assert is_excluded(_path('a/.hidden')) is False
+    assert _Excluder([], exclude_dotfiles=True)(_path('a/.hidden')) is True
+    with pytest.raises(TypeError):
+        _Excluder([b'*.txt'], exclude_dotfiles=False)
+
+
+def test_excluder_re2_absolute():
+    """Test that absolute globs do not prevent combining patterns with RE2."""
+    re2 = pytest.importorskip('re2')
+    is_excluded = _Excluder(['*.txt', '/b/*.md', 'b/*'], exclude_dotfiles=False)
+    [matcher] = is_excluded._matchers
+    assert isinstance(matcher, type(re2.compile('')))
+    assert is_excluded(_path('a/b/c.md')) is True
+    assert is_excluded(_path('a/c.md')) is False
+    assert is_excluded(_path('a/c.txt')) is True
@@ -1,219 +1,321 @@
-"""Tests for `zip-files` executable."""
+"""Tests for `zip-files` executable.
+
+The test data in `ROOT` is read-only: tests that need to modify files work on
+copies in `tmp_path`. Thus, the tests can run in parallel (``pytest -n``).
+"""
 
 import io
 import os
 import stat
 import sys
-import time
+import tarfile
+from datetime import date
 from pathlib import Path
-from zipfile import ZipFile
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
 
 import pytest
-from click.testing import CliRunner
-from pkg_resources import parse_version
+from packaging.version import Version
 
-from test_zip_folder import _check_exit_code, _prepare_folder_with_git_excludes
+from test_zip_folder import RUNNER, STDOUT_RUNNER, _check_exit_code
 from zip_files import __version__
+from zip_files.backend import zip_files as zip_files_backend
 from zip_files.zip_files import zip_files
+from zip_files.zipfile_extensions import ZIP_ZSTANDARD, enable_zstandard
 
 
 ROOT = Path(__file__).parent / 'root'
 
+# The files (as strings, for the command line) zipped by the basic tests
+FILES = [
+    str(ROOT / 'user' / 'folder' / 'My Documents'),
+    str(ROOT / 'user' / 'folder' / 'Hello World.docx'),
+    str(ROOT / 'user' / 'folder2' / 'FILE.txt'),
+]
+
+
+def _run_and_open(args, outfile=None):
+    """Run zip-files with `args` and open the resulting archive.
+
+    The archive is written to stdout and opened in memory, or, if `outfile`
+    is given, written to and opened from `outfile`. Returns a
+    :class:`zipfile.ZipFile`, after checking the archive's integrity.
+    """
+    if outfile is None:
+        result = STDOUT_RUNNER.invoke(zip_files, ['--debug'] + args)
+        _check_exit_code(result)
+        zipfile = ZipFile(io.BytesIO(result.stdout_bytes))
+    else:
+        result = RUNNER.invoke(zip_files, ['--debug', '-o', outfile] + args)
+        _check_exit_code(result)
+        zipfile = ZipFile(outfile)
+    assert zipfile.testzip() is None
+    return zipfile
+
 
 def test_valid_version():
     """Check that the package defines a valid ``__version__``."""
-    runner = CliRunner()
-    result = runner.invoke(zip_files, ['--version'])
+    result = RUNNER.invoke(zip_files, ['--version'])
     assert __version__ in result.output
     assert result.exit_code == 0
-    v_curr = parse_version(__version__)
-    v_orig = parse_version("0.1.0-dev")
-    assert v_curr >= v_orig
-
-
-def test_zip_files_simple(tmp_path):
-    """Test a simple "zip-folder FOLDER"."""
-    runner = CliRunner()
-    outfile = tmp_path / 'simple.zip'
-    files = [
-        ROOT / 'user' / 'folder' / 'My Documents',
-        ROOT / 'user' / 'folder' / 'Hello World.docx',
-        ROOT / 'user' / 'folder2' / 'FILE.txt',
-    ]
-    result = runner.invoke(
-        zip_files, ['--debug', '-o', str(outfile)] + [str(f) for f in files]
+    assert Version(__version__) >= Version("0.1.0-dev")
+
+
+@pytest.mark.parametrize(
+    "options, outfile, root",
+    [
+        pytest.param([], None, '', id='simple'),
+        pytest.param(['--root-folder', 'xyz'], None, 'xyz/', id='root'),
+        pytest.param(
+            ['--root-folder', 'xyz'], 'simple.zip', 'xyz/', id='root_outfile'
+        ),
+        pytest.param(['-a'], 'autoroot.zip', 'autoroot/', id='auto_root'),
+    ],
+)
+def test_zip_files(tmp_path, my_documents_entries, options, outfile, root):
+    """Test zip-files with "--root-folder", "--auto-root", or neither.
+
+    Without `outfile`, the zip file is written to stdout.
+    """
+    if outfile is not None:
+        outfile = str(tmp_path / outfile)
+    expected_files = {root + 'Hello World.docx', root + 'FILE.txt'} | {
+        root + "My Documents/" + name for name in my_documents_entries
+    }
+    args = options + FILES
+    with _run_and_open(args, outfile) as zipfile:
+        assert set(zipfile.namelist()) == expected_files
+
+
+@pytest.mark.parametrize("solid", [False, True])
+def test_zip_files_fileobj(my_documents_entries, solid):
+    """Test the backend writing to a file-like object."""
+    buffer = io.BytesIO()
+    zip_files_backend(
+        debug=False,
+        root_folder='xyz',
+        compression=ZIP_DEFLATED,
+        exclude=[],
+        exclude_from=[],
+        exclude_dotfiles=False,
+        exclude_vcs=False,
+        exclude_git_ignores=False,
+        outfile=buffer,
+        files=FILES,
+        solid=solid,
     )
-    _check_exit_code(result)
-    expected_files = ['Hello World.docx', 'FILE.txt'] + [
-        "/".join(["My Documents", f.name]) for f in files[0].iterdir()
-    ]
-    with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
+    assert not buffer.closed
+    with ZipFile(buffer) as zipfile:
+        assert zipfile.testzip() is None
+        if solid:
+            assert zipfile.namelist() == ['archive.tar']
+        else:
+            assert len(zipfile.namelist()) == len(my_documents_entries) + 2
+
+
+@pytest.mark.parametrize("root_folder", [Path('xyz'), Path('.'), None])
+def test_zip_files_root_folder_path(my_documents_entries, root_folder):
+    """Test the backend with a :class:`pathlib.Path` as `root_folder`."""
+    buffer = io.BytesIO()
+    zip_files_backend(
+        debug=False,
+        root_folder=root_folder,
+        compression=ZIP_DEFLATED,
+        exclude=[],
+        exclude_from=[],
+        exclude_dotfiles=False,
+        exclude_vcs=False,
+        exclude_git_ignores=False,
+        outfile=buffer,
+        files=FILES[:2],
+    )
+    prefix = 'xyz/' if root_folder == Path('xyz') else ''
+    expected_files = {prefix + 'Hello World.docx'} | {
+        prefix + 'My Documents/' + name for name in my_documents_entries
+    }
+    with ZipFile(buffer) as zipfile:
         assert zipfile.testzip() is None
-        assert set(zipfile.namelist()) == set(expected_files)
+        assert set(zipfile.namelist()) == expected_files
 
 
-def test_zip_files_with_root_folder(tmp_path):
-    """Test zip-files with "--root-folder"."""
-    runner = CliRunner()
-    outfile = tmp_path / 'simple.zip'
-    files = [
-        ROOT / 'user' / 'folder' / 'My Documents',
-        ROOT / 'user' / 'folder' / 'Hello World.docx',
-        ROOT / 'user' / 'folder2' / 'FILE.txt',
+@pytest.mark.parametrize('compression', ['stored', 'deflated', 'lzma'])
+def test_zip_files_jobs(tmp_path, compression):
+    """Test zip-files with "--jobs"."""
+    archives = {}
+    for jobs in ['1', '2']:
+        outfile = tmp_path / ('jobs%s.zip' % jobs)
+        result = RUNNER.invoke(
+            zip_files,
+            ['--debug', '-o', str(outfile), '-c', compression, '-j', jobs]
+            + FILES,
+        )
+        _check_exit_code(result)
+        archives[jobs] = outfile
+    with ZipFile(archives['1']) as serial, ZipFile(archives['2']) as parallel:
+        assert parallel.testzip() is None
+        assert parallel.namelist() == serial.namelist()
+        for name in serial.namelist():
+            assert parallel.read(name) == serial.read(name)
+
+
+def test_zip_files_level(tmp_path):
+    """Test zip-files with "--level"."""
+    folder = ROOT / 'user' / 'folder'
+    sizes = {}
+    for level in ['0', '1', '9']:
+        outfile = tmp_path / ('level%s.zip' % level)
+        result = RUNNER.invoke(
+            zip_files,
+            ['--debug', '-o', str(outfile), '-l', level, str(folder)],
+        )
+        _check_exit_code(result)
+        with ZipFile(outfile) as zipfile:
+            assert zipfile.testzip() is None
+        sizes[level] = outfile.stat().st_size
+    assert sizes['0'] > sizes['1'] >= sizes['9']
+
+    outfile = tmp_path / 'invalid.zip'
+    invalid_args = [
+        ['-l', '10'],
+        ['-c', 'bzip2', '-l', '0'],
+        ['-c', 'lzma', '-l', '1'],
     ]
-    result = runner.invoke(
-        zip_files,
-        ['--debug', '-o', str(outfile), '--root-folder', 'xyz']
-        + [str(f) for f in files],
+    for args in invalid_args:
+        result = RUNNER.invoke(
+            zip_files, ['-o', str(outfile)] + args + [str(folder)]
+        )
+        assert result.exit_code != 0
+        assert "Invalid value for '--level'" in result.output
+
+
+def test_zip_files_zstd(tmp_path):
+    """Test zip-files with "--compression=zstd"."""
+    outfile = tmp_path / 'zstd.zip'
+    folder = ROOT / 'user' / 'folder'
+    result = RUNNER.invoke(
+        zip_files, ['--debug', '-o', str(outfile), '-c', 'zstd', str(folder)]
     )
+    try:
+        enable_zstandard()
+    except RuntimeError:
+        assert result.exit_code != 0
+        assert "Invalid value for '--compression'" in result.output
+        return
     _check_exit_code(result)
-    expected_files = ['xyz/Hello World.docx', 'xyz/FILE.txt'] + [
-        "/".join(["xyz", "My Documents", f.name]) for f in files[0].iterdir()
-    ]
     with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
         assert zipfile.testzip() is None
-        assert set(zipfile.namelist()) == set(expected_files)
+        for zinfo in zipfile.infolist():
+            if not zinfo.filename.endswith('.gif'):
+                assert zinfo.compress_type == ZIP_ZSTANDARD
 
 
-def test_zip_files_to_stdout():
-    """Test zip-files without --outfile."""
-    runner = CliRunner(mix_stderr=False)
-    files = [
-        ROOT / 'user' / 'folder' / 'My Documents',
-        ROOT / 'user' / 'folder' / 'Hello World.docx',
-        ROOT / 'user' / 'folder2' / 'FILE.txt',
-    ]
-    result = runner.invoke(
+def test_zip_files_large_file(tmp_path):
+    """Test zip-files with a file that is too large to be read at once."""
+    outfile = tmp_path / 'archive.zip'
+    large_file = tmp_path / 'large.txt'
+    data = b"".join(b"line %d\n" % i for i in range(200000))
+    large_file.write_bytes(data)
+    small_file = ROOT / 'user' / 'folder2' / 'FILE.txt'
+    result = RUNNER.invoke(
         zip_files,
-        ['--debug', '--root-folder', 'xyz'] + [str(f) for f in files],
+        ['--debug', '-o', str(outfile), str(large_file), str(small_file)],
     )
     _check_exit_code(result)
-    expected_files = ['xyz/Hello World.docx', 'xyz/FILE.txt'] + [
-        "/".join(["xyz", "My Documents", f.name]) for f in files[0].iterdir()
-    ]
-    assert len(result.stdout_bytes) > 0
-    with ZipFile(io.BytesIO(result.stdout_bytes)) as zipfile:
-        zipfile.debug = 3
+    with ZipFile(outfile) as zipfile:
         assert zipfile.testzip() is None
-        assert set(zipfile.namelist()) == set(expected_files)
+        assert zipfile.namelist() == ['large.txt', 'FILE.txt']
+        assert zipfile.read('large.txt') == data
 
 
-def test_zip_files_auto_root(tmp_path):
-    """Test zip-files with "--auto-root"."""
-    runner = CliRunner()
-    outfile = tmp_path / 'autoroot.zip'
-    files = [
-        ROOT / 'user' / 'folder' / 'My Documents',
-        ROOT / 'user' / 'folder' / 'Hello World.docx',
-        ROOT / 'user' / 'folder2' / 'FILE.txt',
-    ]
-    result = runner.invoke(
-        zip_files,
-        ['--debug', '-o', str(outfile), '-a'] + [str(f) for f in files],
+@pytest.mark.parametrize("jobs", ['1', '2'])
+def test_zip_files_stored_suffixes(tmp_path, jobs):
+    """Test that zip-files does not compress already compressed files."""
+    outfile = tmp_path / 'archive.zip'
+    data = b"Hello World\n" * 1000
+    names = ['data.txt', 'data.gz', 'image.JPG', 'report.pdf']
+    for name in names:
+        (tmp_path / name).write_bytes(data)
+    files = [str(tmp_path / name) for name in names]
+    result = RUNNER.invoke(
+        zip_files, ['--debug', '-o', str(outfile), '-j', jobs] + files
     )
     _check_exit_code(result)
-    expected_files = ['autoroot/Hello World.docx', 'autoroot/FILE.txt'] + [
-        "/".join(["autoroot", "My Documents", f.name])
-        for f in files[0].iterdir()
-    ]
     with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
         assert zipfile.testzip() is None
-        assert set(zipfile.namelist()) == set(expected_files)
+        assert zipfile.getinfo('data.txt').compress_type == ZIP_DEFLATED
+        for name in names[1:]:
+            assert zipfile.getinfo(name).compress_type == ZIP_STORED
+            assert zipfile.read(name) == data
 
 
-def test_zip_files_exclude(tmp_path):
-    """Test zip-files with "--exclude"."""
-    runner = CliRunner()
-    outfile = tmp_path / 'excluded.zip'
-    files = [
-        ROOT / 'user' / 'folder' / 'My Documents',
-        ROOT / 'user' / 'folder' / 'Hello World.docx',
-        ROOT / 'user' / 'folder2' / 'FILE.txt',
-    ]
-    result = runner.invoke(
+def test_zip_files_solid(tmp_path):
+    """Test zip-files with "--solid"."""
+    outfile = tmp_path / 'solid.zip'
+    folder = ROOT / 'user' / 'folder'
+    result = RUNNER.invoke(
         zip_files,
-        [
-            '--debug',
-            '-o',
-            str(outfile),
-            '--exclude',
-            '*.txt',
-            '-x',
-            'My Documents/*.md',
-        ]
-        + [str(f) for f in files],
+        ['--debug', '-o', str(outfile), '--solid', '-f', 'root', str(folder)],
     )
     _check_exit_code(result)
-    expected_files = ['Hello World.docx'] + [
-        "/".join(["My Documents", f.name])
-        for f in files[0].iterdir()
-        if not f.name.endswith('.md')
-    ]
     with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
         assert zipfile.testzip() is None
-        assert set(zipfile.namelist()) == set(expected_files)
+        assert zipfile.namelist() == ['solid.tar']
+        # the zip entry is not seekable on Python 3.6: read it as a stream
+        names = set()
+        with zipfile.open('solid.tar') as in_fh:
+            with tarfile.open(fileobj=in_fh, mode='r|') as tar:
+                for member in tar:
+                    names.add(member.name)
+                    if member.name == 'root/folder/hello.txt':
+                        data = tar.extractfile(member).read()
+    expected_files = {
+        'root/folder/' + f.relative_to(folder).as_posix()
+        for f in folder.glob('**/*')
+        if f.is_file()
+    }
+    assert names == expected_files
+    assert data == (folder / 'hello.txt').read_bytes()
 
 
-def test_zip_files_excludes(tmp_path):
+def test_zip_files_exclude(my_documents_entries):
+    """Test zip-files with "--exclude"."""
+    args = ['--exclude', '*.txt', '-x', 'My Documents/*.md']
+    expected_files = {'Hello World.docx'} | {
+        "My Documents/" + name
+        for name in my_documents_entries
+        if not name.endswith('.md')
+    }
+    with _run_and_open(args + FILES) as zipfile:
+        assert set(zipfile.namelist()) == expected_files
+
+
+def test_zip_files_excludes():
     """Test that zip-files handles exclude patterns correctly."""
-    runner = CliRunner()
-    outfile = tmp_path / 'archive.zip'
-    files = [ROOT / 'folder_with_dotfiles']
-    result = runner.invoke(
-        zip_files,
-        [
-            '--debug',
-            '-o',
-            str(outfile),
-            '-x',
-            'folder_with_dotfiles/a/*.txt',
-            '-x',
-            'b/*.md',
-        ]
-        + [str(f) for f in files],
-    )
-    _check_exit_code(result)
-    expected_files = [
+    args = ['-x', 'folder_with_dotfiles/a/*.txt', '-x', 'b/*.md']
+    expected_files = {
         'folder_with_dotfiles/a/.hidden',
         'folder_with_dotfiles/b/.hidden',
         'folder_with_dotfiles/b/3.txt',
         'folder_with_dotfiles/b/4.txt',
-    ]
-    with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
-        assert zipfile.testzip() is None
-        assert set(zipfile.namelist()) == set(expected_files)
+    }
+    args.append(str(ROOT / 'folder_with_dotfiles'))
+    with _run_and_open(args) as zipfile:
+        assert set(zipfile.namelist()) == expected_files
 
 
-def test_zip_files_exclude_options(tmp_path):
+def test_zip_files_exclude_options(tmp_path, git_excludes_folder):
     """Test --exclude-from, --exclude-vcs, --exclude-git-ignores."""
-    runner = CliRunner()
-    folder = _prepare_folder_with_git_excludes(
-        tmp_path, ROOT / 'folder_with_git_excludes'
-    )
+    folder = git_excludes_folder
 
     # zip without excludes
-    outfile = tmp_path / 'archive_noexclude.zip'
-    result = runner.invoke(
-        zip_files,
-        [
-            '--debug',
-            '-o',
-            str(outfile),
-            '--include-vcs',
-            '--include-git-ignores',
-            str(folder / 'docs'),
-            str(folder / 'README.md'),
-            str(folder / 'HISTORY.md'),
-            str(folder / 'CONTRIBUTING.md'),
-        ],
-    )
-    _check_exit_code(result)
-    expected_files = [
+    args = [
+        '--include-vcs',
+        '--include-git-ignores',
+        str(folder / 'docs'),
+        str(folder / 'README.md'),
+        str(folder / 'HISTORY.md'),
+        str(folder / 'CONTRIBUTING.md'),
+    ]
+    expected_files = {
         'docs/.gitignore',
         'docs/_build/index.html',
         'docs/_build/build.log',
@@ -224,60 +326,38 @@ def test_zip_files_exclude_options(tmp_path):
         'README.md',
         'HISTORY.md',
         'CONTRIBUTING.md',
-    ]
-    with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
-        assert zipfile.testzip() is None
-        assert set(expected_files) == set(zipfile.namelist())
+    }
+    with _run_and_open(args) as zipfile:
+        assert set(zipfile.namelist()) == expected_files
 
     # zip with excludes
     (tmp_path / 'excludes.txt').write_text("HISTORY.md\nCONTRIBUTING.md\n")
-    outfile = tmp_path / 'archive_exclude.zip'
-    result = runner.invoke(
-        zip_files,
-        [
-            '--debug',
-            '-o',
-            str(outfile),
-            '-X',
-            str(tmp_path / 'excludes.txt'),
-            '--exclude-vcs',
-            '--exclude-git-ignores',
-            str(folder / 'docs'),
-            str(folder / 'README.md'),
-        ],
-    )
-    _check_exit_code(result)
-    expected_files = [
+    args = [
+        '-X',
+        str(tmp_path / 'excludes.txt'),
+        '--exclude-vcs',
+        '--exclude-git-ignores',
+        str(folder / 'docs'),
+        str(folder / 'README.md'),
+    ]
+    expected_files = {
         'docs/sources/index.rst',
         'README.md',
-    ]
-    with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
-        assert zipfile.testzip() is None
-        assert set(zipfile.namelist()) == set(expected_files)
+    }
+    with _run_and_open(args) as zipfile:
+        assert set(zipfile.namelist()) == expected_files
 
 
-def test_zip_files_default_include_dotfiles(tmp_path):
+def test_zip_files_default_include_dotfiles():
     """Test that zip-files includes dotfiles by default."""
-    runner = CliRunner()
-    outfile = tmp_path / 'archive.zip'
-    files = [ROOT / 'folder_with_dotfiles']
-    result = runner.invoke(
-        zip_files,
-        ['--debug', '-o', str(outfile), '-x', '*.txt']
-        + [str(f) for f in files],
-    )
-    _check_exit_code(result)
-    expected_files = [
+    expected_files = {
         'folder_with_dotfiles/a/.hidden',
         'folder_with_dotfiles/b/5.md',
         'folder_with_dotfiles/b/.hidden',
-    ]
-    with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
-        assert zipfile.testzip() is None
-        assert set(zipfile.namelist()) == set(expected_files)
+    }
+    args = ['-x', '*.txt', str(ROOT / 'folder_with_dotfiles')]
+    with _run_and_open(args) as zipfile:
+        assert set(zipfile.namelist()) == expected_files
 
 
 @pytest.mark.skipif(
@@ -286,23 +366,16 @@ def test_zip_files_default_include_dotfiles(tmp_path):
 )
 def test_zip_files_preserve_executable(tmp_path):
     """Test that an executable file permission is preserved."""
-    runner = CliRunner()
-    outfile = tmp_path / 'archive.zip'
+    today = date.today().timetuple()[:3]  # before the file is written
     executable = tmp_path / 'executable.sh'
     with open(executable, "w") as fh:
         fh.write("#!/usr/bin/bash\n")
         fh.write('echo "Hello World"\n')
     os.chmod(executable, stat.S_IXUSR | stat.S_IRUSR)
-    result = runner.invoke(
-        zip_files, ['--debug', '-o', str(outfile), str(executable)]
-    )
-    _check_exit_code(result)
-    with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
-        assert zipfile.testzip() is None
+    with _run_and_open([str(executable)]) as zipfile:
         assert set(zipfile.namelist()) == set(["executable.sh"])
         zip_info = zipfile.getinfo("executable.sh")
-        today = time.localtime()
-        today_ymd = (today.tm_year, today.tm_mon, today.tm_mday)
-        assert zip_info.date_time >= today_ymd
-        assert stat.filemode(zip_info.external_attr >> 16) == '-r-x------'
+        assert zip_info.date_time[:3] >= today
+        mode = zip_info.external_attr >> 16
+        assert stat.S_ISREG(mode)
+        assert stat.S_IMODE(mode) == stat.S_IXUSR | stat.S_IRUSR
@@ -1,12 +1,19 @@
-"""Tests for `zip-folder` executable."""
+"""Tests for `zip-folder` executable.
 
+Each test writes its archive only to its own `tmp_path` or to stdout. The
+folders in `ROOT` and the session-wide `git_excludes_folder` are only read.
+"""
+
+import io
 import platform
-import shutil
+import sys
+import traceback
 from pathlib import Path
-from zipfile import ZipFile
+from zipfile import ZIP_BZIP2, ZIP_DEFLATED, ZIP_LZMA, ZIP_STORED, ZipFile
 
+import pytest
 from click.testing import CliRunner
-from pkg_resources import parse_version
+from packaging.version import Version
 
 from zip_files import __version__
 from zip_files.zip_folder import zip_folder
@@ -14,16 +21,19 @@ from zip_files.zip_folder import zip_folder
 
 ROOT = Path(__file__).parent / 'root'
 
+IS_WINDOWS = platform.system() == "Windows"
+
+# Click's test runner keeps no state between invocations, so it can be shared
+RUNNER = CliRunner()
+STDOUT_RUNNER = CliRunner(mix_stderr=False)  # keep stdout free of stderr
+
 
 def test_valid_version():
     """Check that the package defines a valid ``__version__``."""
-    runner = CliRunner()
-    result = runner.invoke(zip_folder, ['--version'])
+    result = RUNNER.invoke(zip_folder, ['--version'])
     assert __version__ in result.output
     assert result.exit_code == 0
-    v_curr = parse_version(__version__)
-    v_orig = parse_version("0.1.0-dev")
-    assert v_curr >= v_orig
+    assert Version(__version__) >= Version("0.1.0-dev")
 
 
 def _check_exit_code(run_res):
@@ -31,6 +41,8 @@ def _check_exit_code(run_res):
         print("STDOUT:")
         print(run_res.stdout)
         print("(END OF STDOUT)")
+        if not isinstance(run_res.exception, (SystemExit, type(None))):
+            traceback.print_exception(*run_res.exc_info, file=sys.stdout)
     assert run_res.exit_code == 0
 
 
@@ -46,14 +58,36 @@ Options:
   -f, --root-folder ROOT_FOLDER   Folder name to use as the top level folder
                                   inside the zip file (replacing FOLDER).
 
-  -c, --compression [stored|deflated|bzip2|lzma]
+  -c, --compression [stored|deflated|bzip2|lzma|zstd]
                                   Zip compression method. The following methods
                                   are available: "stored": no compression;
                                   "deflated": the standard zip compression
                                   method; "bzip2": BZIP2 compression method
                                   (part of the zip standard since 2001); "lzma":
                                   LZMA compression method (part of the zip
-                                  standard since 2006).  [default: deflated]
+                                  standard since 2006); "zstd": Zstandard
+                                  compression method (part of the zip standard
+                                  since 2020, requires Python >= 3.14 or the
+                                  zipfile-zstd package).  [default: deflated]
+
+  -l, --level LEVEL               Compression level: 0-9 for "deflated", 1-9 for
+                                  "bzip2", and 1-22 for "zstd", with higher
+                                  levels compressing better but more slowly. By
+                                  default, use the default level of the
+                                  compression method.
+
+  -j, --jobs N                    Number of processes to use for compressing
+                                  files in parallel. A value of 0 uses one
+                                  process per CPU.  [default: 1]
+
+  --solid                         Pack all files into a single tar archive,
+                                  which is stored in the zip file as one entry,
+                                  compressed as a whole. This results in faster
+                                  and better compression for many small files,
+                                  but the files must be extracted from the tar
+                                  archive after unzipping. The tar archive is
+                                  named after OUTFILE, or "archive.tar" when
+                                  writing to stdout. Implies --jobs=1.
 
   -a, --auto-root                 If given in combination with --outfile, use
                                   the stem of the OUTFILE (without path and
@@ -99,161 +133,135 @@ def test_help():
     This especially needs to be tested since we're auto-transferring help text
     from ``zip-files``.
     """
-    runner = CliRunner()
-    result = runner.invoke(zip_folder, ['--help'])
+    result = RUNNER.invoke(zip_folder, ['--help'])
     assert result.exit_code == 0
     # with open("expected_zip_folder_help.debug", "w") as out_fh:
     #     out_fh.write(result.stdout)
     assert result.stdout.strip() == _ZIP_FOLDER_EXPECTED_HELP
 
 
-def test_zip_folder_simple(tmp_path):
+def test_zip_folder_simple(tmp_path, my_documents_entries):
     """Test a simple "zip-folder FOLDER"."""
-    runner = CliRunner()
     outfile = tmp_path / 'simple.zip'
     folder = ROOT / 'user' / 'folder'
-    result = runner.invoke(
+    result = RUNNER.invoke(
         zip_folder, ['--debug', '-o', str(outfile), str(folder)]
     )
     _check_exit_code(result)
     expected_files = ['folder/Hello World.docx', 'folder/hello.txt'] + [
-        "/".join(["folder", "My Documents", f.name])
-        for f in (folder / 'My Documents').iterdir()
+        "/".join(["folder", "My Documents", name])
+        for name in my_documents_entries
     ]
     with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
         assert zipfile.testzip() is None
         assert set(zipfile.namelist()) == set(expected_files)
 
 
-def test_zip_folder_with_root_folder(tmp_path):
+def test_zip_folder_with_root_folder(tmp_path, my_documents_entries):
     """Test zip-folder with "--root-folder"."""
-    runner = CliRunner()
     outfile = tmp_path / 'root.zip'
     folder = ROOT / 'user' / 'folder'
-    result = runner.invoke(
+    result = RUNNER.invoke(
         zip_folder,
         ['--debug', '-o', str(outfile), '--root-folder', 'xyz', str(folder)],
     )
     _check_exit_code(result)
     expected_files = ['xyz/Hello World.docx', 'xyz/hello.txt'] + [
-        "/".join(["xyz", "My Documents", f.name])
-        for f in (folder / 'My Documents').iterdir()
+        "/".join(["xyz", "My Documents", name])
+        for name in my_documents_entries
     ]
     with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
         assert zipfile.testzip() is None
         assert set(zipfile.namelist()) == set(expected_files)
 
 
-def test_zip_folder_compression(tmp_path):
-    """Test the different compressions."""
-    runner = CliRunner()
-    folder = (ROOT / 'user' / 'folder').resolve()
-    with runner.isolated_filesystem():
-        result = runner.invoke(
-            zip_folder,
-            ['--debug', '-o', 'uncompressed.zip', '-c', 'stored', str(folder)],
-        )
-        _check_exit_code(result)
-        result = runner.invoke(
-            zip_folder,
-            [
-                '--debug',
-                '-o',
-                'deflated.zip',
-                '--compression',
-                'deflated',
-                str(folder),
-            ],
-        )
-        _check_exit_code(result)
-        result = runner.invoke(
-            zip_folder,
-            [
-                '--debug',
-                '-o',
-                'bzip2.zip',
-                '--compression',
-                'BZIP2',
-                str(folder),
-            ],
-        )
-        _check_exit_code(result)
-        result = runner.invoke(
-            zip_folder,
-            [
-                '--debug',
-                '-o',
-                'lzma.zip',
-                '--compression',
-                'Lzma',
-                str(folder),
-            ],
+@pytest.fixture(scope='module')
+def compressed_archives():
+    """Zip files (as bytes) of the test folder, for each compression."""
+    folder = ROOT / 'user' / 'folder'
+    archives = {}
+    for compression in ['stored', 'deflated', 'BZIP2', 'Lzma']:
+        # write to stdout, so that the zip file is only held in memory
+        result = STDOUT_RUNNER.invoke(
+            zip_folder, ['--debug', '--compression', compression, str(folder)]
         )
         _check_exit_code(result)
-        outfiles = [
-            Path('uncompressed.zip'),
-            Path('deflated.zip'),
-            Path('bzip2.zip'),
-            Path('lzma.zip'),
-        ]
-        for file in outfiles:
-            print("size(%s) = %s" % (file.resolve(), file.stat().st_size))
-        s_uncompressed = Path('uncompressed.zip').stat().st_size
-        s_deflated = Path('deflated.zip').stat().st_size
-        s_bzip2 = Path('bzip2.zip').stat().st_size
-        s_lzma = Path('lzma.zip').stat().st_size
-        assert s_uncompressed > s_deflated
-        assert s_uncompressed > s_bzip2
-        assert s_uncompressed > s_lzma
-        assert s_uncompressed != s_bzip2 != s_lzma
-
-        result = runner.invoke(
-            zip_folder,
-            [
-                '--debug',
-                '-o',
-                'invalid.zip',
-                '--compression',
-                'invalid',
-                str(folder),
-            ],
-        )
-        assert result.exit_code != 0
-        assert (
-            "Invalid value for " in result.output
-            and "--compression" in result.output
-        )
+        archives[compression] = result.stdout_bytes
+    return archives
+
+
+@pytest.mark.parametrize(
+    "compression, compress_type",
+    [
+        ('stored', ZIP_STORED),
+        ('deflated', ZIP_DEFLATED),
+        ('BZIP2', ZIP_BZIP2),
+        ('Lzma', ZIP_LZMA),
+    ],
+)
+def test_zip_folder_compression(
+    compression, compress_type, compressed_archives
+):
+    """Test the different compressions."""
+    data = compressed_archives[compression]
+    with ZipFile(io.BytesIO(data)) as zipfile:
+        assert zipfile.testzip() is None
+        info = zipfile.getinfo('folder/hello.txt')
+        assert info.compress_type == compress_type
+    if compress_type != ZIP_STORED:
+        assert len(data) < len(compressed_archives['stored'])
+
+
+def test_zip_folder_compression_sizes(compressed_archives):
+    """Test that the compression methods are actually applied."""
+    sizes = {
+        compression: len(data)
+        for (compression, data) in compressed_archives.items()
+    }
+    print("sizes: %s" % sizes)
+    assert sizes['stored'] > sizes['deflated']
+    assert sizes['stored'] > sizes['BZIP2']
+    assert sizes['stored'] > sizes['Lzma']
+    assert sizes['BZIP2'] != sizes['Lzma']
+
+
+def test_zip_folder_invalid_compression():
+    """Test that an unknown compression is rejected."""
+    folder = ROOT / 'user' / 'folder'
+    result = STDOUT_RUNNER.invoke(
+        zip_folder, ['--debug', '--compression', 'invalid', str(folder)]
+    )
+    assert result.exit_code != 0
+    assert (
+        "Invalid value for " in result.stderr
+        and "--compression" in result.stderr
+    )
 
 
-def test_zip_folder_auto_root(tmp_path):
+def test_zip_folder_auto_root(tmp_path, my_documents_entries):
     """Test zip-folder with "--auto-root"."""
-    runner = CliRunner()
     outfile = tmp_path / 'archive.zip'
     folder = ROOT / 'user' / 'folder'
-    result = runner.invoke(
+    result = RUNNER.invoke(
         zip_folder,
         ['--debug', '-o', str(outfile), '--auto-root', str(folder)],
     )
     _check_exit_code(result)
     expected_files = ['archive/Hello World.docx', 'archive/hello.txt'] + [
-        "/".join(["archive", "My Documents", f.name])
-        for f in (folder / 'My Documents').iterdir()
+        "/".join(["archive", "My Documents", name])
+        for name in my_documents_entries
     ]
     with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
         assert zipfile.testzip() is None
         assert set(zipfile.namelist()) == set(expected_files)
 
 
 def test_invalid_auto_root():
     """Test imcompatibility of --auto-root and other options."""
-    runner = CliRunner()
     outfile = 'archive.zip'
     folder = ROOT
 
-    result = runner.invoke(
+    result = RUNNER.invoke(
         zip_folder,
         [
             '--debug',
@@ -268,7 +276,7 @@ def test_invalid_auto_root():
     assert result.exit_code != 0
     assert '--auto-root is incompatible with --root-folder' in result.output
 
-    result = runner.invoke(
+    result = RUNNER.invoke(
         zip_folder,
         ['--debug', '--auto-root', str(folder)],
     )
@@ -276,53 +284,41 @@ def test_invalid_auto_root():
     assert '--auto-root requires --outfile' in result.output
 
 
-def test_zip_folder_exclude(tmp_path):
+def test_zip_folder_exclude(tmp_path, my_documents_entries):
     """Test zip-folder with basic "--exclude"."""
-    runner = CliRunner()
     outfile = tmp_path / 'excluded.zip'
     folder = ROOT / 'user' / 'folder'
-    result = runner.invoke(
+    result = RUNNER.invoke(
         zip_folder, ['--debug', '-o', str(outfile), str(folder), '-x', '*.txt']
     )
     _check_exit_code(result)
     expected_files = ['folder/Hello World.docx'] + [
-        "/".join(["folder", "My Documents", f.name])
-        for f in (folder / 'My Documents').iterdir()
+        "/".join(["folder", "My Documents", name])
+        for name in my_documents_entries
     ]
     with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
         assert zipfile.testzip() is None
         assert set(zipfile.namelist()) == set(expected_files)
 
 
-def _prepare_folder_with_git_excludes(tmp_path, original):
-    """Add git-ignored files to folder."""
-    root = tmp_path / original.stem
-    shutil.copytree(original, root)
-    for file in root.glob('**/*.py'):
-        shutil.copy(file, file.with_suffix('.pyc'))
-    for file in root.glob('**/Makefile.in'):
-        shutil.copy(file, file.parent / 'Makefile')
-    for (i, file) in enumerate(['file1.rst', 'file2.rst'], start=1):
-        (root / 'docs' / 'sources' / 'API' / file).write_text("file %d" % i)
-    (root / "venv").mkdir()
-    (root / "venv" / "README.md").write_text("# This is a virtual env")
-    (root / 'docs' / '_build').mkdir()
-    (root / 'docs' / '_build' / 'build.log').write_text("# build log")
-    (root / 'docs' / '_build' / 'index.html').write_text("# HTML")
-    return root
-
-
-def test_zip_folder_exclude_options(tmp_path):
+def _normcase(names):
+    """Return the set of `names`, lower-cased on Windows.
+
+    Windows has problems with filesystem case sensitivity, cf.
+    https://bugs.python.org/issue26655
+    """
+    if IS_WINDOWS:
+        return {name.lower() for name in names}
+    return set(names)
+
+
+def test_zip_folder_exclude_options(tmp_path, git_excludes_folder):
     """Test --exclude-from, --exclude-vcs, --exclude-git-ignores."""
-    runner = CliRunner()
-    folder = _prepare_folder_with_git_excludes(
-        tmp_path, ROOT / 'folder_with_git_excludes'
-    )
+    folder = git_excludes_folder
 
     # zip without excludes
     outfile = tmp_path / 'archive_noexclude.zip'
-    result = runner.invoke(
+    result = RUNNER.invoke(
         zip_folder,
         [
             '--debug',
@@ -358,25 +354,18 @@ def test_zip_folder_exclude_options(tmp_path):
         'folder_with_git_excludes/src/module/file1.py',
         'folder_with_git_excludes/src/module/__init__.pyc',
     ]
-    if platform.system() == "Windows":
-        # Windows has problems with filesystem case sensitivity.
-        # https://bugs.python.org/issue26655
-        expected_files = [f.lower() for f in expected_files]
     with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
         assert zipfile.testzip() is None
         # the zip file might include additional pyc and __pycache__files that
         # pytest may have created in the source folder, hence we test for the
         # subset of files we created manually.
-        files = list(zipfile.namelist())
-        if platform.system() == "Windows":
-            files = [f.lower() for f in files]
-        assert set(expected_files).issubset(files)
+        files = _normcase(zipfile.namelist())
+        assert _normcase(expected_files).issubset(files)
 
     # zip with excludes
     (tmp_path / 'excludes.txt').write_text("HISTORY.md\nCONTRIBUTING.md\n")
     outfile = tmp_path / 'archive_exclude.zip'
-    result = runner.invoke(
+    result = RUNNER.invoke(
         zip_folder,
         [
             '--debug',
@@ -400,24 +389,17 @@ def test_zip_folder_exclude_options(tmp_path):
         'folder_with_git_excludes/src/module/sub/__init__.py',
         'folder_with_git_excludes/src/module/file1.py',
     ]
-    if platform.system() == "Windows":
-        # Windows has problems with filesystem case sensitivity.
-        expected_files = [f.lower() for f in expected_files]
     with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
         assert zipfile.testzip() is None
-        files = list(zipfile.namelist())
-        if platform.system() == "Windows":
-            files = [f.lower() for f in files]
-        assert set(files) == set(expected_files)
+        files = _normcase(zipfile.namelist())
+        assert files == _normcase(expected_files)
 
 
 def test_zip_folder_include_dotfiles(tmp_path):
     """Test zip-folder with "--include-dotfiles"."""
-    runner = CliRunner()
     outfile = tmp_path / 'archive.zip'
     folder = ROOT / 'folder_with_dotfiles'
-    result = runner.invoke(
+    result = RUNNER.invoke(
         zip_folder,
         [
             '--debug',
@@ -436,17 +418,15 @@ def test_zip_folder_include_dotfiles(tmp_path):
         'folder_with_dotfiles/b/.hidden',
     ]
     with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
         assert zipfile.testzip() is None
         assert set(zipfile.namelist()) == set(expected_files)
 
 
 def test_zip_folder_exclude_dotfiles(tmp_path):
     """Test zip-folder with "--exlude-dotfiles"."""
-    runner = CliRunner()
     outfile = tmp_path / 'archive.zip'
     folder = ROOT / 'folder_with_dotfiles'
-    result = runner.invoke(
+    result = RUNNER.invoke(
         zip_folder,
         [
             '--debug',
@@ -461,6 +441,5 @@ def test_zip_folder_exclude_dotfiles(tmp_path):
     _check_exit_code(result)
     expected_files = ['folder_with_dotfiles/b/5.md']
     with ZipFile(outfile) as zipfile:
-        zipfile.debug = 3
         assert zipfile.testzip() is None
         assert set(zipfile.namelist()) == set(expected_files)
@@ -0,0 +1,172 @@
+"""Tests for `zip_files.zipfile_extensions`."""
+import binascii
+import io
+import zipfile
+import zlib
+from zipfile import ZIP_BZIP2, ZIP_DEFLATED, ZIP_LZMA, ZIP_STORED, ZipInfo
+
+import pytest
+
+from zip_files.zipfile_extensions import (
+    _LIBDEFLATE_MAX_SIZE,
+    ZipFile,
+    _libdeflate,
+    _LibdeflateCompressor,
+    crc32,
+    get_compressor,
+)
+
+
+DATA = b"Hello World\n" * 1000 + bytes(range(256))
+
+
+@pytest.mark.parametrize(
+    "compression", [ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2, ZIP_LZMA]
+)
+def test_roundtrip(compression):
+    """Test that a zip written by our ZipFile is read back by the stdlib."""
+    buffer = io.BytesIO()
+    with ZipFile(buffer, mode='w', compression=compression) as zipfile:
+        zipfile.writestr('data.bin', DATA)
+        with zipfile.open('streamed.bin', mode='w') as dest:
+            for i in range(0, len(DATA), 1000):
+                dest.write(DATA[i : i + 1000])
+    with ZipFile(io.BytesIO(buffer.getvalue())) as zipfile:
+        assert zipfile.testzip() is None
+        assert zipfile.read('data.bin') == DATA
+        assert zipfile.read('streamed.bin') == DATA
+        info = zipfile.getinfo('data.bin')
+        assert info.compress_type == compression
+        if compression != ZIP_STORED:
+            assert info.compress_size < info.file_size
+
+
+def test_compresslevel():
+    """Test that the archive's `compresslevel` applies to `open` entries."""
+    sizes = {}
+    for compresslevel in [0, 9]:
+        buffer = io.BytesIO()
+        with ZipFile(
+            buffer,
+            mode='w',
+            compression=ZIP_DEFLATED,
+            compresslevel=compresslevel,
+        ) as zipfile:
+            zinfo = ZipInfo('data.bin', date_time=(2021, 1, 1, 0, 0, 0))
+            zinfo.compress_type = ZIP_DEFLATED
+            with zipfile.open(zinfo, mode='w') as dest:
+                dest.write(DATA)
+        with ZipFile(io.BytesIO(buffer.getvalue())) as zipfile:
+            assert zipfile.read('data.bin') == DATA
+            sizes[compresslevel] = zipfile.getinfo('data.bin').compress_size
+    assert sizes[0] > len(DATA) > sizes[9]
+
+
+@pytest.mark.parametrize("compression", [ZIP_STORED, ZIP_BZIP2, ZIP_LZMA])
+def test_get_compressor_level(compression):
+    """Test `compresslevel` for methods other than ZIP_DEFLATED."""
+    compressor = get_compressor(compression, 1)
+    if compression == ZIP_STORED:
+        assert compressor is None
+    else:
+        data = compressor.compress(DATA) + compressor.flush()
+        assert len(data) < len(DATA)
+
+
+def test_get_compressor_size():
+    """Test that data of unknown or large size is not buffered in memory."""
+    for size in [None, _LIBDEFLATE_MAX_SIZE + 1]:
+        compressor = get_compressor(ZIP_DEFLATED, size=size)
+        assert not isinstance(compressor, _LibdeflateCompressor)
+
+
+@pytest.mark.parametrize("compresslevel", [None, 0, 1, 3, 9])
+@pytest.mark.parametrize("size", [len(DATA), None])
+def test_get_compressor_deflated(compresslevel, size):
+    """Test that all deflate compressors produce valid raw DEFLATE data."""
+    compressor = get_compressor(ZIP_DEFLATED, compresslevel, size=size)
+    data = compressor.compress(DATA) + compressor.flush()
+    assert zlib.decompress(data, -15) == DATA
+
+
+@pytest.mark.skipif(_libdeflate is None, reason="requires deflate package")
+def test_libdeflate_compressor():
+    """Test that libdeflate compresses data passed as memoryview slices."""
+    compressor = _LibdeflateCompressor()
+    data = b''
+    with memoryview(DATA) as view:
+        for i in range(0, len(view), 1000):
+            data += compressor.compress(view[i : i + 1000])
+    data += compressor.flush()
+    assert zlib.decompress(data, -15) == DATA
+
+
+def test_crc32():
+    """Test that `crc32` is equivalent to :func:`zlib.crc32`."""
+    assert crc32(DATA) == zlib.crc32(DATA)
+    assert crc32(DATA[100:], crc32(DATA[:100])) == zlib.crc32(DATA)
+    assert crc32(memoryview(DATA)) == zlib.crc32(DATA)
+
+
+@pytest.mark.parametrize("compression", [ZIP_STORED, ZIP_DEFLATED])
+def test_crc32_written(compression):
+    """Test the checksums we write against the standard library's."""
+    assert zipfile.crc32 in (zlib.crc32, binascii.crc32)  # not replaced
+    buffer = io.BytesIO()
+    with ZipFile(buffer, mode='w', compression=compression) as archive:
+        archive.writestr('data.bin', DATA)
+        with archive.open('streamed.bin', mode='w') as dest:
+            with memoryview(DATA) as view:
+                for i in range(0, len(view), 1000):
+                    dest.write(view[i : i + 1000])
+    with zipfile.ZipFile(io.BytesIO(buffer.getvalue())) as archive:
+        assert archive.testzip() is None
+        for name in ['data.bin', 'streamed.bin']:
+            assert archive.getinfo(name).CRC == zlib.crc32(DATA)
+
+
+class _Unseekable(io.RawIOBase):
+    """Write-only stream that cannot seek, like a pipe."""
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self._buffer.write(data)
+
+
+@pytest.mark.parametrize("seekable", [True, False])
+def test_copy_entries(seekable):
+    """Test copying entries from another zip archive."""
+    shards = []
+    for i in range(2):
+        shard = io.BytesIO()
+        with ZipFile(shard, mode='w', compression=ZIP_DEFLATED) as zipfile:
+            zipfile.writestr('data%d.bin' % i, DATA)
+            zipfile.writestr('other%d.txt' % i, b"Hello World")
+        shards.append(shard)
+    buffer = io.BytesIO()
+    if seekable:
+        out_fh = buffer
+    else:
+        out_fh = _Unseekable(buffer)
+    with ZipFile(out_fh, mode='w') as zipfile:
+        zipfile.writestr('first.txt', b"first")
+        for shard in shards:
+            zipfile.copy_entries(shard)
+        zipfile.writestr('last.txt', b"last")
+    with ZipFile(io.BytesIO(buffer.getvalue())) as zipfile:
+        assert zipfile.testzip() is None
+        assert zipfile.namelist() == [
+            'first.txt',
+            'data0.bin',
+            'other0.txt',
+            'data1.bin',
+            'other1.txt',
+            'last.txt',
+        ]
+        assert zipfile.read('data1.bin') == DATA
+        assert zipfile.read('last.txt') == b"last"